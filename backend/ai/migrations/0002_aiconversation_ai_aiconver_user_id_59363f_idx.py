@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aiconversation',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='ai_aiconver_user_id_59363f_idx'),
+        ),
+    ]
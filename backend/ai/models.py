@@ -12,4 +12,7 @@ class AIConversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id']),  # Keyset pagination of a user's conversations
+        ]
\ No newline at end of file
@@ -6,10 +6,13 @@ from .serializers import AIConversationSerializer
 from .utils import get_response
 from rest_framework.permissions import IsAuthenticated
 from .utils import GeminiAPIError
+from utils.pagination import KeysetPagination
 
 class AIConversationViewSet(viewsets.ModelViewSet):
     serializer_class = AIConversationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         return AIConversation.objects.filter(
@@ -0,0 +1,411 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from tenants.resolver import tenant_resolver
+from .models import Appointment, DailyAvailability, TimeOff, WorkingHours
+
+# Used when settings.CLINIC_WORKING_HOURS is not set: Monday to Friday, 9 AM to 5 PM
+DEFAULT_WORKING_HOURS = {weekday: [(time(9), time(17))] for weekday in range(5)}
+
+SCHEDULES_CACHE_KEY = 'appointments:schedules:{}'
+
+# First key of the pg_advisory_xact_lock serializing the bitmap updates of a dentist
+BITMAP_LOCK_CLASS = 7201
+# First key of the lock of a whole schema's bitmaps, second key hashtext(schema_name):
+# held shared by every bitmap update, exclusively by refresh_stored_bitmaps()
+BITMAP_SCHEMA_LOCK_CLASS = 7202
+
+
+def get_working_hours():
+    """
+    {weekday: [(start, end), ...]}, weekday 0 is Monday. Several ranges per day
+    leave room for a lunch break. The hours of the dentists without WorkingHours.
+    """
+    return getattr(settings, 'CLINIC_WORKING_HOURS', DEFAULT_WORKING_HOURS)
+
+
+def load_schedules(dentist_ids=None):
+    """
+    {dentist_id: {weekday: [(start, end), ...]}} of the current tenant (of the
+    dentists `ids` only if given), one query.
+    """
+    queryset = WorkingHours.objects.order_by('dentist_id', 'weekday', 'start_time')
+    if dentist_ids is not None:
+        queryset = queryset.filter(dentist_id__in=dentist_ids)
+    schedules = {}
+    for dentist_id, weekday, start, end in queryset.values_list('dentist_id', 'weekday', 'start_time', 'end_time'):
+        schedules.setdefault(dentist_id, {}).setdefault(weekday, []).append((start, end))
+    return schedules
+
+
+def get_schedules():
+    """
+    load_schedules() of every dentist, from the shared cache. Cleared by the
+    WorkingHours signals (appointments/signals.py). Only used to enumerate
+    slot starts: the stored bitmaps are always computed from the DB.
+    """
+    key = SCHEDULES_CACHE_KEY.format(connection.schema_name)
+    schedules = cache.get(key)
+    if schedules is None:
+        schedules = load_schedules()
+        cache.set(key, schedules, timeout=getattr(settings, 'SCHEDULES_CACHE_TTL', 300))
+    return schedules
+
+
+def clear_schedules(schema_name=None):
+    cache.delete(SCHEDULES_CACHE_KEY.format(schema_name or connection.schema_name))
+
+
+def get_dentist_hours(dentist_id, schedules=None):
+    schedules = get_schedules() if schedules is None else schedules
+    return schedules.get(dentist_id) or get_working_hours()
+
+
+def get_time_off(dentist_ids, range_start, range_end):
+    """
+    {dentist_id: [(start, end), ...]} of the time off overlapping the range,
+    one query. Time off of the whole clinic is given to every dentist.
+    """
+    time_off = defaultdict(list)
+    clinic = []
+    for dentist_id, start, end in (TimeOff.objects
+                                   .filter(Q(dentist_id__in=dentist_ids) | Q(dentist__isnull=True),
+                                           start_time__lt=range_end, end_time__gt=range_start)
+                                   .values_list('dentist_id', 'start_time', 'end_time')):
+        (clinic if dentist_id is None else time_off[dentist_id]).append((start, end))
+    return {dentist_id: time_off[dentist_id] + clinic for dentist_id in dentist_ids}
+
+
+def day_bounds(start_date, end_date, tz=None):
+    """
+    Half-open [start, end) aware bounds covering the days from start_date to
+    end_date included, midnight to midnight in `tz` (the current timezone, the
+    clinic's during a request). Filtering start_time >= start AND < end can use
+    an index on start_time, start_time__date can't.
+    """
+    tz = tz or timezone.get_current_timezone()
+    return (timezone.make_aware(datetime.combine(start_date, time.min), tz),
+            timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz))
+
+
+def working_windows(start_date, end_date, working_hours=None, tz=None):
+    """
+    Aware (start, end) working intervals of every day from start_date to
+    end_date included, in chronological order.
+    """
+    working_hours = get_working_hours() if working_hours is None else working_hours
+    tz = tz or timezone.get_current_timezone()
+    day = start_date
+    while day <= end_date:
+        for opens, closes in working_hours.get(day.weekday(), ()):
+            yield (timezone.make_aware(datetime.combine(day, opens), tz),
+                   timezone.make_aware(datetime.combine(day, closes), tz))
+        day += timedelta(days=1)
+
+
+def merge_busy(bookings):
+    """
+    Sorts (start, end) bookings once and merges the overlapping/touching ones.
+    """
+    merged = []
+    for start, end in sorted(bookings):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def get_bookings(queryset, range_start, range_end, fields=('start_time', 'end_time')):
+    """
+    `fields` of the appointments of `queryset` overlapping the range, one
+    query. Cancelled appointments don't hold their slot.
+    """
+    return list(queryset
+                .filter(start_time__lt=range_end, end_time__gt=range_start)
+                .exclude(status=Appointment.Status.CANCELLED)
+                .values_list(*fields))
+
+
+def get_granularity():
+    """
+    Minutes per bit of the DailyAvailability bitmaps, must divide a day.
+    """
+    return getattr(settings, 'AVAILABILITY_BITMAP_MINUTES', 5)
+
+
+def tenant_timezone():
+    """
+    Timezone of the tenant of the connection, the one its days are cut in. Not
+    the current timezone: signals and commands run outside of any request.
+    """
+    name = getattr(getattr(connection, 'tenant', None), 'timezone', None)
+    if name is None:
+        tenant = tenant_resolver.get_tenant_by_schema(connection.schema_name)
+        name = getattr(tenant, 'timezone', None)
+    try:
+        return ZoneInfo(name) if name else timezone.get_default_timezone()
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.get_default_timezone()
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute + value.second / 60
+
+
+def _mask(first, last):
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def local_days(start, end, tz):
+    """
+    The days of `tz` the half-open interval (start, end) touches.
+    """
+    first = timezone.localtime(start, tz).date()
+    last = timezone.localtime(end - timedelta(microseconds=1), tz).date()
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def working_mask(hours, day, granularity):
+    """
+    Bits of the cells of `day` entirely within the working hours.
+    """
+    mask = 0
+    for opens, closes in hours.get(day.weekday(), ()):
+        mask |= _mask(-(-int(_minutes(opens)) // granularity), int(_minutes(closes)) // granularity)
+    return mask
+
+
+def busy_mask(start, end, day, tz, granularity):
+    """
+    Bits of the cells of `day` the interval overlaps, even partly.
+    """
+    midnight = datetime.combine(day, time.min)
+    first = (timezone.localtime(start, tz).replace(tzinfo=None) - midnight).total_seconds() / 60
+    last = (timezone.localtime(end, tz).replace(tzinfo=None) - midnight).total_seconds() / 60
+    cells = 24 * 60 // granularity
+    return _mask(max(int(first // granularity), 0), min(int(-(-last // granularity)), cells))
+
+
+def day_bitmap(hours, day, busy, tz, granularity):
+    """
+    Bitmap of one day: the working cells minus the ones the busy (start, end)
+    intervals touch.
+    """
+    bitmap = working_mask(hours, day, granularity)
+    for start, end in busy:
+        bitmap &= ~busy_mask(start, end, day, tz, granularity)
+    return bitmap
+
+
+def compute_bitmaps(pairs):
+    """
+    {(dentist_id, day): bitmap} of the (dentist_id, day) pairs, from one query
+    each for the bookings, the time off and the working hours. The hours are
+    read from the DB, not the cache: a bitmap built from stale hours would be
+    stored until the next change.
+    """
+    if not pairs:
+        return {}
+    tz, granularity = tenant_timezone(), get_granularity()
+    dentist_ids = sorted({dentist_id for dentist_id, _ in pairs})
+    days = [day for _, day in pairs]
+    range_start, range_end = day_bounds(min(days), max(days), tz)
+
+    busy = get_time_off(dentist_ids, range_start, range_end)
+    for dentist_id, start, end in get_bookings(Appointment.objects.filter(dentist_id__in=dentist_ids),
+                                               range_start, range_end,
+                                               fields=('dentist_id', 'start_time', 'end_time')):
+        busy[dentist_id].append((start, end))
+    # Busy intervals by the days they touch, so each day only looks at its own
+    by_day = defaultdict(list)
+    for dentist_id, intervals in busy.items():
+        for start, end in intervals:
+            for day in local_days(start, end, tz):
+                by_day[dentist_id, day].append((start, end))
+
+    schedules = load_schedules(dentist_ids)
+    return {(dentist_id, day): day_bitmap(get_dentist_hours(dentist_id, schedules), day,
+                                          by_day[dentist_id, day], tz, granularity)
+            for dentist_id, day in pairs}
+
+
+def _store_bitmaps(bitmaps):
+    granularity = get_granularity()
+    size = (24 * 60 // granularity + 7) // 8
+    DailyAvailability.objects.bulk_create(
+        [DailyAvailability(dentist_id=dentist_id, day=day, granularity=granularity,
+                           free=bitmap.to_bytes(size, 'little'))
+         for (dentist_id, day), bitmap in bitmaps.items()],
+        update_conflicts=True,
+        unique_fields=['dentist', 'day'],
+        update_fields=['granularity', 'free', 'updated_at'],
+    )
+
+
+def refresh_bitmaps(pairs):
+    """
+    Recomputes and stores the bitmaps of the (dentist_id, day) pairs. The
+    advisory locks make concurrent refreshes of a dentist run one after the
+    other, so the last one to write has read every committed booking.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, hashtext(%s))",
+                           [BITMAP_SCHEMA_LOCK_CLASS, connection.schema_name])
+            for dentist_id in sorted({dentist_id for dentist_id, _ in pairs}):
+                cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [BITMAP_LOCK_CLASS, dentist_id % 2 ** 31])
+        bitmaps = compute_bitmaps(pairs)
+        _store_bitmaps(bitmaps)
+    return bitmaps
+
+
+def refresh_stored_bitmaps(**filters):
+    """
+    Recomputes the stored bitmaps matching `filters` (dentist_id=..., day__in=...),
+    after a change touching many days: working hours, clinic-wide time off.
+
+    Runs alone in the schema, after the bitmap updates in progress: a day a
+    concurrent read is storing from the old data is refreshed too, not missed.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+                           [BITMAP_SCHEMA_LOCK_CLASS, connection.schema_name])
+        pairs = set(DailyAvailability.objects.filter(**filters).values_list('dentist_id', 'day'))
+        _store_bitmaps(compute_bitmaps(pairs))
+
+
+def bitmap_days(intervals, tz=None):
+    """
+    The (dentist_id, day) pairs touched by (dentist_id, start, end) intervals.
+    """
+    tz = tz or tenant_timezone()
+    return {(dentist_id, day) for dentist_id, start, end in intervals for day in local_days(start, end, tz)}
+
+
+def refresh_on_commit(pairs):
+    """
+    Refreshes the bitmaps of the (dentist_id, day) pairs once the transaction
+    commits, right away outside of one. The pairs of a whole transaction (a
+    queryset delete(), a bulk booking) are refreshed together, by the first
+    callback to run.
+    """
+    db = connections[DEFAULT_DB_ALIAS]
+    pending = getattr(db, 'availability_pending', None)
+    if pending is None:
+        pending = db.availability_pending = defaultdict(set)
+    schema_name = db.schema_name
+    pending[schema_name].update(pairs)
+
+    def flush():
+        batch = pending.pop(schema_name, None)
+        if batch:
+            with schema_context(schema_name):
+                refresh_bitmaps(batch)
+
+    transaction.on_commit(flush)
+
+
+def get_bitmaps(dentist_ids, start_date, end_date):
+    """
+    {(dentist_id, day): bitmap} from start_date to end_date included, one query.
+    Days not stored yet (or stored with another granularity) are computed
+    and stored on the way, so a GET may write: under the same locks as every
+    other bitmap update, from the DB, never from cached data.
+    """
+    granularity = get_granularity()
+    bitmaps = {
+        (dentist_id, day): int.from_bytes(free, 'little')
+        for dentist_id, day, free in DailyAvailability.objects
+        .filter(dentist_id__in=dentist_ids, day__range=(start_date, end_date), granularity=granularity)
+        .values_list('dentist_id', 'day', 'free')
+    }
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    missing = {(dentist_id, day) for dentist_id in dentist_ids for day in days} - bitmaps.keys()
+    if missing:
+        bitmaps.update(refresh_bitmaps(missing))
+    return bitmaps
+
+
+def bitmap_slots(bitmap, day, hours, slot_length, step, tz, granularity):
+    """
+    Free slots of `slot_length` in one day. Starts are aligned on `step` from
+    the opening of each working range: 09:00, 09:15, ... with a 15 minute step.
+    A slot is free when all of its cells are set, one AND per candidate.
+    """
+    length = slot_length.total_seconds() / 60
+    step = step.total_seconds() / 60
+    midnight = datetime.combine(day, time.min)
+    for opens, closes in hours.get(day.weekday(), ()):
+        start, closes = _minutes(opens), _minutes(closes)
+        while start + length <= closes:
+            mask = _mask(int(start // granularity), int(-(-(start + length) // granularity)))
+            if bitmap & mask == mask:
+                slot_start = timezone.make_aware(midnight + timedelta(minutes=start), tz)
+                yield slot_start, slot_start + slot_length
+            start += step
+
+
+def get_availability(dentist_id, start_date, end_date, slot_length, step=None):
+    """
+    Free slots of one dentist between two dates (included), within their
+    working hours and outside their bookings and time off. Read from the
+    stored daily bitmaps.
+    """
+    return list(_dentist_slots([dentist_id], start_date, end_date, slot_length, step)[dentist_id])
+
+
+def _dentist_slots(dentist_ids, start_date, end_date, slot_length, step=None):
+    """
+    {dentist_id: lazy (start, end) iterator}, every bitmap read with one query.
+    """
+    step = step or slot_length
+    tz, granularity = tenant_timezone(), get_granularity()
+    bitmaps = get_bitmaps(dentist_ids, start_date, end_date)
+    schedules = get_schedules()
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+    def slots(dentist_id):
+        hours = get_dentist_hours(dentist_id, schedules)
+        for day in days:
+            bitmap = bitmaps.get((dentist_id, day), 0)
+            if bitmap:
+                yield from bitmap_slots(bitmap, day, hours, slot_length, step, tz, granularity)
+
+    return {dentist_id: slots(dentist_id) for dentist_id in dentist_ids}
+
+
+def first_available(dentist_ids, start_date, end_date, slot_length, count, step=None, not_before=None):
+    """
+    The `count` earliest free slots across several dentists, as
+    (start, end, dentist_id) sorted by start then dentist.
+
+    One query reads the bitmaps of every dentist and day. Each dentist's free
+    slots are a lazy scan and heapq.merge() pulls from all of them at once,
+    so only the slots up to the count-th one are ever computed.
+    """
+    if not dentist_ids:
+        return []
+    dentist_slots = _dentist_slots(sorted(dentist_ids), start_date, end_date, slot_length, step)
+
+    def tagged(dentist_id):
+        for start, end in dentist_slots[dentist_id]:
+            if not_before is None or start >= not_before:
+                yield start, dentist_id, end
+
+    merged = heapq.merge(*(tagged(dentist_id) for dentist_id in sorted(dentist_slots)))
+    return [(start, end, dentist_id) for start, dentist_id, end in islice(merged, count)]
@@ -0,0 +1,208 @@
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET
+from django_tenants.utils import schema_context
+from .models import Appointment, CalendarFeed
+
+# Past appointments older than this are left out of the feeds
+FEED_PAST_DAYS = 90
+# Rows fetched per round trip from the server-side cursor
+FEED_CHUNK_SIZE = 500
+
+ICAL_STATUS = {
+    Appointment.Status.SCHEDULED: 'TENTATIVE',
+    Appointment.Status.CONFIRMED: 'CONFIRMED',
+    Appointment.Status.COMPLETED: 'CONFIRMED',
+    Appointment.Status.CANCELLED: 'CANCELLED',
+}
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """
+    RFC 5545 lines are at most 75 octets, longer ones continue on lines
+    starting with a space. Never splits a UTF-8 character.
+    """
+    parts, current, size = [], '', 0
+    for char in line:
+        length = len(char.encode())
+        if size + length > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += length
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _format(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def feed_queryset(feed):
+    queryset = Appointment.objects.filter(start_time__gte=timezone.now() - timedelta(days=FEED_PAST_DAYS))
+    if feed.dentist_id is not None:
+        queryset = queryset.filter(dentist_id=feed.dentist_id)
+    return queryset
+
+
+def _ical_header(name):
+    return ''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//DentiaPro//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name)}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+    ])
+
+
+def _ical_event(row, host):
+    (pk, start_time, end_time, status, notes, updated_at,
+     first_name, last_name, dentist_first_name, dentist_last_name) = row
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:appointment-{pk}@{host}',
+        f'DTSTAMP:{_format(updated_at)}',
+        f'LAST-MODIFIED:{_format(updated_at)}',
+        f'DTSTART:{_format(start_time)}',
+        f'DTEND:{_format(end_time)}',
+        f'SUMMARY:{_escape(f"{first_name} {last_name}")}',
+        f'STATUS:{ICAL_STATUS.get(status, "TENTATIVE")}',
+        f'X-DENTIST:{_escape(f"{dentist_first_name} {dentist_last_name}")}',
+    ]
+    if notes:
+        lines.append(f'DESCRIPTION:{_escape(notes)}')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def ical_lines(rows, host, name):
+    """
+    The calendar as text chunks, one per event, for a StreamingHttpResponse.
+    Cancelled appointments are kept with STATUS:CANCELLED so subscribed
+    calendars remove them.
+    """
+    yield _ical_header(name)
+    for row in rows:
+        yield _ical_event(row, host)
+    yield _fold('END:VCALENDAR')
+
+
+async def aical_lines(rows, host, name):
+    """
+    ical_lines() reading `rows` from a thread, a chunk at a time. Served by the
+    ASGI application, which would read a synchronous iterator into a list
+    first. QuerySet.aiterator() can't be used: it runs values_list() queries
+    on the event loop.
+    """
+    next_chunk = sync_to_async(lambda: list(islice(rows, FEED_CHUNK_SIZE)))
+    yield _ical_header(name)
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield _ical_event(row, host)
+    yield _fold('END:VCALENDAR')
+
+
+def _get_feed(request, token):
+    # Looked up once for both the ETag and the view. The feed of a deactivated
+    # user is revoked with them.
+    if not hasattr(request, 'calendar_feed'):
+        request.calendar_feed = (CalendarFeed.objects.select_related('dentist')
+                                 .filter(token=token, created_by__is_active=True).first())
+    return request.calendar_feed
+
+
+def feed_etag(request, token):
+    """
+    Built from the feed's changed_at (see touch_feeds()), its calendar name and
+    today's date, as past events leave the window every day. Nothing is read
+    beyond the feed: the events are only read when the client's copy is stale.
+    """
+    feed = _get_feed(request, token)
+    if feed is None:
+        return None
+    name = feed.dentist.last_name if feed.dentist else request.tenant.name
+    content = repr((feed.changed_at, timezone.localdate(), name))
+    return f"{feed.pk}-{hashlib.sha256(content.encode()).hexdigest()[:32]}"
+
+
+def touch_feeds(dentist_ids=None):
+    """
+    Changes the ETag of the feeds of the current schema showing appointments of
+    `dentist_ids`: theirs and the clinic's. Every feed when None. One UPDATE.
+    """
+    feeds = CalendarFeed.objects.all()
+    if dentist_ids is not None:
+        feeds = feeds.filter(Q(dentist_id__in=dentist_ids) | Q(dentist__isnull=True))
+    feeds.update(changed_at=timezone.now())
+
+
+def touch_on_commit(dentist_ids=None):
+    """
+    touch_feeds() once the transaction commits, right away outside of one. The
+    dentists of a whole transaction are touched in one UPDATE.
+    """
+    if dentist_ids is not None:
+        dentist_ids = set(dentist_ids)
+        if not dentist_ids:
+            return
+    db = connections[DEFAULT_DB_ALIAS]
+    pending = getattr(db, 'feeds_pending', None)
+    if pending is None:
+        pending = db.feeds_pending = {}
+    schema_name = db.schema_name
+    if dentist_ids is None:
+        # Every feed, whatever was pending
+        pending[schema_name] = None
+    elif pending.get(schema_name, set()) is not None:
+        pending[schema_name] = pending.get(schema_name, set()) | dentist_ids
+
+    def flush():
+        if schema_name not in pending:
+            return
+        batch = pending.pop(schema_name)
+        with schema_context(schema_name):
+            touch_feeds(batch)
+
+    transaction.on_commit(flush)
+
+
+@require_GET
+@condition(etag_func=feed_etag)
+def calendar_feed(request, token):
+    """
+    GET /api/appointments/ics/<token>.ics, anonymous (see CalendarFeed). Answers
+    304 when If-None-Match matches, streams the events from a server-side
+    cursor otherwise, through an async iterator under ASGI.
+    """
+    feed = _get_feed(request, token)
+    if feed is None:
+        raise Http404
+    # A generator: the query only runs when the first chunk is read
+    rows = (feed_queryset(feed)
+            .order_by('start_time', 'id')
+            .values_list('id', 'start_time', 'end_time', 'status', 'notes', 'updated_at',
+                         'patient__first_name', 'patient__last_name',
+                         'dentist__first_name', 'dentist__last_name')
+            .iterator(chunk_size=FEED_CHUNK_SIZE))
+    name = f"Dr. {feed.dentist.last_name}" if feed.dentist else request.tenant.name
+    lines = aical_lines if isinstance(request, ASGIRequest) else ical_lines
+    response = StreamingHttpResponse(lines(rows, request.get_host(), name),
+                                     content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="appointments.ics"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,216 @@
+import asyncio
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django_tenants.utils import schema_context
+from .models import Appointment
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Appointments per notification, pg_notify payloads are limited to 8000 bytes
+NOTIFY_CHUNK = 40
+# Seconds the listener waits for notifications before applying new LISTEN/UNLISTEN
+LISTEN_POLL_SECONDS = 1
+# Events a slow client may lag behind before it is told to reload instead
+CLIENT_QUEUE_SIZE = 100
+# Seconds between keepalive comments on an idle stream
+SSE_HEARTBEAT_SECONDS = 15
+# Sent to a client that may have missed events: lagging, or the listener reconnected
+RELOAD = json.dumps({'reload': True})
+
+
+def get_channel(schema_name):
+    return f'appointments_{schema_name}'
+
+
+def notify_appointments(appointment_ids):
+    """
+    Publishes the current state of the appointments `ids` of the current schema
+    on its channel, {"appointments": [...]}. A deleted appointment is only
+    {"id", "deleted": true}. One query, one pg_notify per NOTIFY_CHUNK appointments.
+    """
+    appointment_ids = sorted(set(appointment_ids))
+    rows = {
+        row['id']: row for row in Appointment.objects.filter(id__in=appointment_ids)
+        .values('id', 'patient_id', 'dentist_id', 'start_time', 'end_time', 'status', 'updated_at')
+    }
+    events = [rows.get(pk, {'id': pk, 'deleted': True}) for pk in appointment_ids]
+    with connection.cursor() as cursor:
+        for offset in range(0, len(events), NOTIFY_CHUNK):
+            payload = json.dumps({'appointments': events[offset:offset + NOTIFY_CHUNK]}, cls=DjangoJSONEncoder)
+            cursor.execute('SELECT pg_notify(%s, %s)', [get_channel(connection.schema_name), payload])
+
+
+def notify_on_commit(appointment_ids):
+    """
+    notify_appointments() once the transaction commits, right away outside of
+    one. The appointments of a whole transaction go out in one batch, and
+    listeners never hear of a change that was rolled back.
+    """
+    db = connections[DEFAULT_DB_ALIAS]
+    pending = getattr(db, 'live_pending', None)
+    if pending is None:
+        pending = db.live_pending = defaultdict(set)
+    schema_name = db.schema_name
+    pending[schema_name].update(appointment_ids)
+
+    def flush():
+        batch = pending.pop(schema_name, None)
+        if batch:
+            with schema_context(schema_name):
+                notify_appointments(batch)
+
+    transaction.on_commit(flush)
+
+
+class AppointmentListener:
+    """
+    The one LISTEN connection of the process, shared by the event streams of
+    every tenant. A channel is listened to while at least one client of its
+    tenant is connected. Lives on the event loop of the ASGI server.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.listening = set()
+        # Set once the channel of a schema is listened to
+        self.ready = {}
+        self.task = None
+
+    def _conninfo(self):
+        db = settings.DATABASES[DEFAULT_DB_ALIAS]
+        return {
+            'dbname': db['NAME'], 'user': db['USER'], 'password': db['PASSWORD'],
+            'host': db['HOST'], 'port': db['PORT'], **db.get('OPTIONS', {}),
+        }
+
+    async def subscribe(self, schema_name):
+        """
+        A queue receiving the payloads of the schema's channel. Returns once the
+        channel is listened to: nothing committed afterwards is missed.
+        """
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.subscribers[schema_name].add(queue)
+        ready = self.ready.setdefault(schema_name, asyncio.Event())
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        try:
+            await ready.wait()
+        except asyncio.CancelledError:
+            # The client left first
+            self.unsubscribe(schema_name, queue)
+            raise
+        return queue
+
+    def unsubscribe(self, schema_name, queue):
+        self.subscribers[schema_name].discard(queue)
+        if not self.subscribers[schema_name]:
+            # Unlistened by the next round of the listener
+            del self.subscribers[schema_name]
+            self.ready.pop(schema_name, None)
+
+    def _publish(self, schema_name, payload):
+        for queue in self.subscribers.get(schema_name, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RELOAD)
+
+    async def _sync_channels(self, conn):
+        wanted = set(self.subscribers)
+        for schema_name in wanted - self.listening:
+            await conn.execute(f'LISTEN "{get_channel(schema_name)}"')
+        for schema_name in self.listening - wanted:
+            await conn.execute(f'UNLISTEN "{get_channel(schema_name)}"')
+        self.listening = wanted
+        for schema_name in wanted:
+            if schema_name in self.ready:
+                self.ready[schema_name].set()
+
+    async def _run(self):
+        # psycopg ships with Django's PostgreSQL backend; imported here, only the ASGI server needs it
+        import psycopg
+
+        while self.subscribers:
+            try:
+                async with await psycopg.AsyncConnection.connect(**self._conninfo(), autocommit=True) as conn:
+                    if self.listening:
+                        # Reconnected: whatever was notified meanwhile is lost
+                        for schema_name in self.listening:
+                            self._publish(schema_name, RELOAD)
+                        self.listening = set()
+                    while self.subscribers:
+                        await self._sync_channels(conn)
+                        channels = {get_channel(schema_name): schema_name for schema_name in self.listening}
+                        async for notify in conn.notifies(timeout=LISTEN_POLL_SECONDS):
+                            if notify.channel in channels:
+                                self._publish(channels[notify.channel], notify.payload)
+            except psycopg.Error as e:
+                logger.error(f"Appointment listener lost its connection, reconnecting: {e}")
+                await asyncio.sleep(LISTEN_POLL_SECONDS)
+        self.listening = set()
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.listening = set()
+
+
+listener = AppointmentListener()
+
+
+async def _event_stream(schema_name, queue):
+    try:
+        yield 'event: ready\ndata: {}\n\n'
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {'reload' if payload == RELOAD else 'appointments'}\ndata: {payload}\n\n"
+    finally:
+        listener.unsubscribe(schema_name, queue)
+
+
+@require_GET
+async def appointment_events(request):
+    """
+    GET /api/appointments/events/, a Server-Sent Events stream of the tenant's
+    appointment changes (see notify_appointments()), instead of polling the list.
+    Needs an ASGI server (core/asgi.py). Authenticated by the Authorization
+    header like the rest of the API, so EventSource needs a fetch-based polyfill.
+
+    A "ready" event comes first: load the calendar after it, nothing is missed.
+    On a "reload" event, load it again.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the stream would hold a worker for as long as the client stays
+        return JsonResponse({"error": "Live updates are only served by the ASGI application"}, status=501)
+    user, _ = request.jwt_auth
+    if not await sync_to_async(user.has_perm)('appointments.view_appointment'):
+        return JsonResponse({"error": "You do not have permission to perform this action."}, status=403)
+    schema_name = request.tenant.schema_name
+    queue = await listener.subscribe(schema_name)
+    response = StreamingHttpResponse(_event_stream(schema_name, queue), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Unbuffered through nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
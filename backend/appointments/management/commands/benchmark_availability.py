@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from appointments.availability import (bitmap_slots, day_bitmap, get_granularity, get_working_hours, local_days,
+                                       working_windows)
+
+
+def legacy_slots(bookings, start_date, end_date):
+    """
+    The previous calendar_slots loop: every hourly slot re-scans all bookings.
+    """
+    slots = []
+    current = start_date
+    while current <= end_date:
+        if current.weekday() < 5:
+            for hour in range(9, 17):
+                slot_start = timezone.make_aware(datetime.combine(current, datetime.min.time().replace(hour=hour)))
+                slot_end = slot_start + timedelta(minutes=60)
+                if not any(b_start <= slot_start <= b_end or b_start <= slot_end <= b_end or
+                           (slot_start <= b_start and slot_end >= b_end) for b_start, b_end in bookings):
+                    slots.append((slot_start, slot_end))
+        current += timedelta(days=1)
+    return slots
+
+
+def build_bitmaps(bookings, days, hours, tz, granularity):
+    """
+    The daily bitmaps compute_bitmaps() stores, minus the queries.
+    """
+    by_day = defaultdict(list)
+    for start, end in bookings:
+        for day in local_days(start, end, tz):
+            by_day[day].append((start, end))
+    return {day: day_bitmap(hours, day, by_day[day], tz, granularity) for day in days}
+
+
+def served_slots(bitmaps, hours, slot_length, step, tz, granularity):
+    """
+    What get_availability() does with the stored bitmaps.
+    """
+    return [slot for day, bitmap in bitmaps.items() if bitmap
+            for slot in bitmap_slots(bitmap, day, hours, slot_length, step, tz, granularity)]
+
+
+class Command(BaseCommand):
+    help = ('Compare the availability served from daily bitmaps with the previous calendar_slots loop '
+            'on a dense synthetic calendar')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--per-day', type=int, default=12, help='Appointments per working day')
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        start_date = date(2025, 1, 6)
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        bookings = []
+        for window_start, window_end in working_windows(start_date, end_date):
+            for _ in range(options['per_day']):
+                start = window_start + timedelta(minutes=15 * rng.randrange(32))
+                bookings.append((start, min(start + timedelta(minutes=rng.choice([15, 30, 45, 60])), window_end)))
+        self.stdout.write(f"{len(bookings)} bookings over {options['days']} days")
+
+        hours, tz, granularity = get_working_hours(), timezone.get_current_timezone(), get_granularity()
+        days = [start_date + timedelta(days=offset) for offset in range(options['days'])]
+        bitmaps = build_bitmaps(bookings, days, hours, tz, granularity)
+        runs = {
+            'legacy loop': lambda: legacy_slots(bookings, start_date, end_date),
+            # Paid on writes, a day at a time
+            'bitmap build': lambda: list(build_bitmaps(bookings, days, hours, tz, granularity).items()),
+            'bitmap 60/60': lambda: served_slots(bitmaps, hours, timedelta(minutes=60), timedelta(minutes=60),
+                                                 tz, granularity),
+            'bitmap 30/15': lambda: served_slots(bitmaps, hours, timedelta(minutes=30), timedelta(minutes=15),
+                                                 tz, granularity),
+        }
+        for label, run in runs.items():
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                slots = run()
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f"{label:<12} median={statistics.median(timings):.1f}ms slots={len(slots)}")
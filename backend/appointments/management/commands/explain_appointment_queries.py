@@ -0,0 +1,120 @@
+import random
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django_tenants.utils import schema_context, get_public_schema_name
+from appointments.availability import day_bounds, working_windows
+from appointments.models import Appointment
+from patients.models import Patient
+from tenants.models import Tenant
+from users.models import User
+
+BENCHMARK_MARKER = 'benchmark-ranges'
+
+
+class Command(BaseCommand):
+    help = ('Fill a tenant calendar with N appointments and EXPLAIN the date-range queries of the '
+            'appointments API. Exits with an error when one of them scans the whole table.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', required=True, help='Tenant schema to generate the appointments in')
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--keep', action='store_true', help="Don't delete the generated appointments")
+
+    def handle(self, *args, **options):
+        with schema_context(get_public_schema_name()):
+            tenant = Tenant.objects.filter(schema_name=options['schema']).first()
+            dentists = list(User.objects.filter(tenant=tenant).values_list('id', flat=True)) if tenant else []
+        if not dentists:
+            raise CommandError(f"{options['schema']} is not a tenant with at least one user")
+
+        with schema_context(tenant.schema_name), timezone.override(ZoneInfo(tenant.timezone)):
+            try:
+                first_day = self.generate(tenant, dentists, options['appointments'])
+                failed = [label for label, queryset in self.queries(tenant, dentists, first_day).items()
+                          if not self.check_plan(label, queryset)]
+            finally:
+                if not options['keep']:
+                    Appointment.objects.filter(notes=BENCHMARK_MARKER).delete()
+                    Patient.objects.filter(insurance_id=BENCHMARK_MARKER).delete()
+        if failed:
+            raise CommandError(f"Sequential scan on appointments for: {', '.join(failed)}")
+
+    def generate(self, tenant, dentists, count):
+        """
+        Back to back 30 minute appointments for every dentist, working hours only,
+        so the calendar is valid under the no-overlap constraint. Returns the first day.
+        """
+        first_day = date(2000, 1, 3)
+        existing = Appointment.objects.filter(notes=BENCHMARK_MARKER).count()
+        if existing >= count:
+            return first_day
+        self.stdout.write(f'Generating {count - existing} appointments...')
+        Appointment.objects.filter(notes=BENCHMARK_MARKER).delete()
+        patient = Patient.objects.filter(insurance_id=BENCHMARK_MARKER).first() or Patient.objects.create(
+            first_name='Benchmark', last_name='Ranges', date_of_birth=date(1980, 1, 1),
+            phone_number='+212600000000', email='benchmark-ranges@example.com',
+            insurance_id=BENCHMARK_MARKER, dentist_id=dentists[0], tenant=tenant,
+        )
+        rng = random.Random(3)
+        statuses = Appointment.Status.values
+        slot = timedelta(minutes=30)
+        batch, created = [], 0
+        # Open-ended on purpose, generation stops at `count`
+        for opens, closes in working_windows(first_day, first_day + timedelta(days=365 * 200)):
+            start = opens
+            while start + slot <= closes and created < count:
+                for dentist_id in dentists[:count - created]:
+                    batch.append(Appointment(
+                        patient=patient, dentist_id=dentist_id, start_time=start, end_time=start + slot,
+                        status=rng.choice(statuses), notes=BENCHMARK_MARKER, tenant=tenant,
+                    ))
+                created += min(len(dentists), count - created)
+                start += slot
+            if len(batch) >= 5000 or created >= count:
+                Appointment.objects.bulk_create(batch)
+                batch = []
+            if created >= count:
+                break
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Appointment._meta.db_table}')
+        return first_day
+
+    def queries(self, tenant, dentists, first_day):
+        """
+        The range queries of AppointmentViewSet, for one week of a large calendar.
+        """
+        week_start, week_end = day_bounds(first_day + timedelta(days=70), first_day + timedelta(days=76))
+        appointments = Appointment.objects.filter(tenant=tenant)
+        in_week = appointments.filter(start_time__gte=week_start, start_time__lt=week_end)
+        return {
+            'calendar week': in_week.order_by('start_time', 'id')[:10],
+            'calendar week of a dentist': in_week.filter(dentist_id=dentists[0]),
+            'scheduled this week': in_week.filter(status=Appointment.Status.SCHEDULED),
+            'availability bookings': appointments.filter(dentist_id=dentists[0]).filter(
+                start_time__lt=week_end, end_time__gt=week_start,
+            ).exclude(status=Appointment.Status.CANCELLED),
+        }
+
+    def check_plan(self, label, queryset):
+        plan = self.explain(queryset)
+        table = Appointment._meta.db_table
+        seq_scan = f'Seq Scan on {table}' in plan
+        indexes = sorted({index.name for index in Appointment._meta.indexes if index.name in plan}
+                         | {word for word in plan.split() if word.startswith(f'{table}_')})
+        self.stdout.write(
+            f"{label:<28} {'SEQ SCAN' if seq_scan else 'index scan'} "
+            f"{', '.join(indexes) if indexes else ''}"
+        )
+        if seq_scan:
+            self.stdout.write(plan)
+        return not seq_scan
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context, get_public_schema_name
+from appointments.waitlist import expire_offers
+from tenants.models import Tenant
+from tenants.template import get_template_schema_name
+
+
+class Command(BaseCommand):
+    help = 'Expire the waitlist offers nobody answered in time and offer their slots to the next patients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema, repeatable. Every active tenant when omitted')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and process the offers every INTERVAL seconds (background worker mode)')
+
+    def handle(self, *args, **options):
+        while True:
+            with schema_context(get_public_schema_name()):
+                tenants = (Tenant.objects.filter(is_active=True)
+                           .exclude(schema_name__in=[get_public_schema_name(), get_template_schema_name()]))
+                if options['schemas']:
+                    tenants = tenants.filter(schema_name__in=options['schemas'])
+                schema_names = list(tenants.values_list('schema_name', flat=True))
+            for schema_name in schema_names:
+                with schema_context(schema_name):
+                    expired = expire_offers()
+                if expired:
+                    self.stdout.write(f'{schema_name}: {expired} offers expired and passed on')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+from appointments.availability import compute_bitmaps, get_granularity, refresh_bitmaps, tenant_timezone
+from appointments.models import DailyAvailability
+from django.utils import timezone
+from users.models import User
+
+# Days refreshed per transaction
+BATCH_DAYS = 31
+
+
+class Command(BaseCommand):
+    help = ('Recompute the daily availability bitmaps of the dentists (backfill), or compare the '
+            'stored ones with a recomputation (--check, exits with an error on differences)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema, repeatable. Every tenant when omitted')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD), default today')
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--check', action='store_true', help="Report stale bitmaps, don't write")
+
+    def handle(self, *args, **options):
+        tenants = get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+        stale = 0
+        for tenant in tenants:
+            dentists = list(User.objects.filter(tenant=tenant, role__in=[User.Role.ADMIN, User.Role.DENTIST])
+                            .values_list('id', flat=True))
+            with schema_context(tenant.schema_name):
+                start = options['start'] or timezone.localdate(timezone=tenant_timezone())
+                for offset in range(0, options['days'], BATCH_DAYS):
+                    days = [start + timedelta(days=day)
+                            for day in range(offset, min(offset + BATCH_DAYS, options['days']))]
+                    pairs = {(dentist_id, day) for dentist_id in dentists for day in days}
+                    if options['check']:
+                        stale += self.check_bitmaps(tenant, pairs)
+                    else:
+                        refresh_bitmaps(pairs)
+            if not options['check']:
+                self.stdout.write(f"{tenant.schema_name}: {len(dentists)} dentists, {options['days']} days")
+        if stale:
+            raise CommandError(f"{stale} stale bitmaps, run without --check to fix them")
+
+    def check_bitmaps(self, tenant, pairs):
+        granularity = get_granularity()
+        stored = {
+            (dentist_id, day): int.from_bytes(free, 'little') if row_granularity == granularity else None
+            for dentist_id, day, row_granularity, free in DailyAvailability.objects
+            .filter(dentist_id__in={dentist_id for dentist_id, _ in pairs}, day__in={day for _, day in pairs})
+            .values_list('dentist_id', 'day', 'granularity', 'free')
+        }
+        stale = 0
+        for (dentist_id, day), bitmap in sorted(compute_bitmaps(pairs).items()):
+            # Missing days are fine, they are computed on read
+            if (dentist_id, day) in stored and stored[dentist_id, day] != bitmap:
+                stale += 1
+                self.stdout.write(f"{tenant.schema_name}: dentist {dentist_id} on {day} is stale")
+        return stale
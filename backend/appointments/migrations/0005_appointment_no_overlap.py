@@ -0,0 +1,65 @@
+# Generated by Django 5.1 on 2026-10-18 10:06
+
+from bisect import bisect_left
+
+import appointments.models
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+from django.utils import timezone
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def cancel_overlapping_appointments(apps, schema_editor):
+    """
+    The constraint can't be added over existing double bookings: of the
+    non-cancelled appointments of a dentist that overlap, the first booked
+    stays, the later ones are cancelled and logged.
+    """
+    Appointment = apps.get_model('appointments', 'Appointment')
+    table = Appointment._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT DISTINCT a.dentist_id FROM {table} a JOIN {table} b
+                ON b.dentist_id = a.dentist_id AND b.id <> a.id
+               AND b.start_time < a.end_time AND a.start_time < b.end_time
+            WHERE a.status <> 'CANCELLED' AND b.status <> 'CANCELLED'
+        """)
+        dentist_ids = [row[0] for row in cursor.fetchall()]
+    cancelled = []
+    for dentist_id in dentist_ids:
+        # Start and end times of the appointments kept, sorted and disjoint
+        starts, ends = [], []
+        for pk, start_time, end_time in (Appointment.objects
+                                         .filter(dentist_id=dentist_id).exclude(status='CANCELLED')
+                                         .order_by('created_at', 'id')
+                                         .values_list('id', 'start_time', 'end_time')):
+            i = bisect_left(starts, start_time)
+            if (i < len(starts) and starts[i] < end_time) or (i > 0 and ends[i - 1] > start_time):
+                cancelled.append(pk)
+                logger.warning(f"Appointment {pk} of dentist {dentist_id} ({start_time} - {end_time}) "
+                               f"overlaps an earlier booking in {schema_editor.connection.schema_name}, cancelled")
+                continue
+            starts.insert(i, start_time)
+            ends.insert(i, end_time)
+    if cancelled:
+        Appointment.objects.filter(pk__in=cancelled).update(status='CANCELLED', updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_appointment_start_t_073569_idx'),
+    ]
+
+    operations = [
+        # = on the dentist_id integer inside a GiST index needs btree_gist
+        migrations.RunSQL('CREATE EXTENSION IF NOT EXISTS btree_gist WITH SCHEMA public', migrations.RunSQL.noop),
+        migrations.RunPython(cancel_overlapping_appointments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status', 'CANCELLED'), _negated=True), expressions=[('dentist', '='), (appointments.models.TsTzRange('start_time', 'end_time'), '&&')], name='appointment_no_overlap', violation_error_message='This time slot overlaps with another appointment'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-18 10:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,8 +1,44 @@
+import calendar
+import secrets
+
 from django.db import models
+from django.db.models import Func, Q
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.utils import timezone
 from patients.models import Patient
 from users.models import User
 from tenants.models import Tenant
 
+class TsTzRange(Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class AppointmentSeries(models.Model):
+    """
+    A recurrence rule booked at once, e.g. weekly ortho adjustments. Its
+    occurrences are plain appointments pointing back to it (see appointments/recurrence.py).
+    """
+    class Frequency(models.TextChoices):
+        DAILY = "DAILY", "Daily"
+        WEEKLY = "WEEKLY", "Weekly"
+        MONTHLY = "MONTHLY", "Monthly"
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, related_name='appointment_series')
+    frequency = models.CharField(max_length=10, choices=Frequency.choices)
+    interval = models.PositiveSmallIntegerField(default=1)
+    count = models.PositiveSmallIntegerField(null=True, blank=True)
+    until = models.DateField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.frequency} series of {self.patient} with Dr. {self.dentist}"
+
+
 class Appointment(models.Model):
     class Status(models.TextChoices):
         SCHEDULED = "SCHEDULED", "Scheduled"
@@ -18,15 +54,195 @@ class Appointment(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by the caller from the request (serializer.save(tenant=...)), never looked up per row
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, null=True, blank=True)
+    series = models.ForeignKey(AppointmentSeries, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='appointments')
     
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['start_time', 'id']),  # Keyset pagination of the list endpoint
+            # Calendar and availability ranges of one dentist, range scans by status
+            # (AppointmentRangePlanTests checks the plans)
+            models.Index(fields=['dentist', 'start_time']),
+            models.Index(fields=['status', 'start_time']),
+        ]
+        constraints = [
+            # A dentist can't have two live appointments overlapping, enforced by the database
+            # so concurrent bookings can't both get through. Ranges are half-open: back to back is fine.
+            ExclusionConstraint(
+                name='appointment_no_overlap',
+                expressions=[
+                    ('dentist', RangeOperators.EQUAL),
+                    (TsTzRange('start_time', 'end_time'), RangeOperators.OVERLAPS),
+                ],
+                condition=~Q(status='CANCELLED'),
+                violation_error_message="This time slot overlaps with another appointment",
+            ),
+        ]
         permissions = [
             ("cancel_appointment", "Can cancel appointment"),
             ("confirm_appointment", "Can confirm appointment"),
         ]
-        
-    def save(self, *args, **kwargs):
-        self.tenant = self.dentist.tenant
-        super().save(*args, **kwargs)
\ No newline at end of file
+
+
+
+class WorkingHours(models.Model):
+    """
+    One working range of a dentist on a weekday (0 is Monday). Several ranges
+    on the same day leave breaks between them. A dentist without any range
+    works the clinic's default hours (see availability.get_working_hours).
+    """
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=[(day, calendar.day_name[day]) for day in range(7)])
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['dentist', 'weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(condition=Q(end_time__gt=models.F('start_time')),
+                                   name='working_hours_end_after_start'),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.dentist} {calendar.day_name[self.weekday]} {self.start_time}-{self.end_time}"
+
+
+class TimeOff(models.Model):
+    """
+    Holidays, training, sick leave... of one dentist, or of the whole clinic
+    when dentist is null. Availability treats it like a booking.
+    """
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='time_off')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['dentist', 'start_time']),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=Q(end_time__gt=models.F('start_time')),
+                                   name='time_off_end_after_start'),
+        ]
+
+    def __str__(self):
+        return f"Time off of {self.dentist or 'the clinic'} from {self.start_time} to {self.end_time}"
+
+
+class DailyAvailability(models.Model):
+    """
+    Free time of one dentist on one day of the clinic's timezone: bit i of
+    `free` (little-endian) is set when minutes [i * granularity, (i + 1) *
+    granularity) are within working hours and neither booked nor time off.
+
+    A cache of Appointment, WorkingHours and TimeOff, kept up to date by
+    appointments/signals.py and rebuilt by manage.py rebuild_availability.
+    Missing days are computed on read (see availability.get_bitmaps).
+    """
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    granularity = models.PositiveSmallIntegerField()  # Minutes per bit
+    free = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['dentist', 'day']]
+
+    def __str__(self):
+        return f"Availability of Dr. {self.dentist_id} on {self.day}"
+
+
+class WaitlistEntry(models.Model):
+    """
+    A patient waiting for an earlier slot: `duration` minutes with the
+    preferred dentist (any when null), between available_from and
+    available_until, optionally only between earliest_time and latest_time of
+    the day. Cancelled slots are offered to entries by appointments/waitlist.py.
+    """
+    class Status(models.TextChoices):
+        WAITING = "WAITING", "Waiting"
+        OFFERED = "OFFERED", "Offered"
+        BOOKED = "BOOKED", "Booked"
+        WITHDRAWN = "WITHDRAWN", "Withdrawn"
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='waitlist_entries')
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    duration = models.PositiveSmallIntegerField()  # Minutes
+    available_from = models.DateTimeField()
+    available_until = models.DateTimeField()
+    earliest_time = models.TimeField(null=True, blank=True)
+    latest_time = models.TimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.WAITING)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # The matcher only ever looks at waiting entries overlapping the freed slots
+            models.Index(fields=['dentist', 'available_from', 'available_until'],
+                         condition=Q(status='WAITING'), name='waitlist_waiting_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} waiting for {self.duration} minutes"
+
+
+class WaitlistOffer(models.Model):
+    """
+    A freed slot held for one waitlist entry until it is accepted, declined or
+    expires_at passes.
+    """
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        ACCEPTED = "ACCEPTED", "Accepted"
+        DECLINED = "DECLINED", "Declined"
+        EXPIRED = "EXPIRED", "Expired"
+
+    entry = models.ForeignKey(WaitlistEntry, on_delete=models.CASCADE, related_name='offers')
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    expires_at = models.DateTimeField()
+    appointment = models.OneToOneField(Appointment, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='waitlist_offer')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['dentist', 'start_time']),
+            models.Index(fields=['expires_at'], condition=Q(status='PENDING'), name='waitlist_offer_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"Offer of {self.start_time} to {self.entry.patient}"
+
+
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeed(models.Model):
+    """
+    Read-only iCalendar subscription of one dentist's schedule, or of the whole
+    clinic when dentist is null. Calendar apps can't send a JWT: the token in
+    the URL is the credential, deleting the feed revokes it.
+    """
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token, editable=False)
+    dentist = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='calendar_feeds')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last change of its events, what its ETag is built from (see calendar_feed.touch_feeds())
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Calendar feed of {self.dentist or 'the clinic'}"
+
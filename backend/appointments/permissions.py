@@ -2,6 +2,9 @@
 from rest_framework.permissions import BasePermission
 class CanManageAppointments(BasePermission):
     def has_permission(self, request, view):
+        if getattr(view, 'action', None) == 'bulk_status':
+            # A POST, but it changes existing appointments
+            return request.user.has_perm('appointments.change_appointment')
         if request.method == 'GET':
             return request.user.has_perm('appointments.view_appointment')
         elif request.method == 'POST':
@@ -11,3 +14,38 @@ class CanManageAppointments(BasePermission):
         elif request.method == 'DELETE':
             return request.user.has_perm('appointments.delete_appointment')
         return False
+
+
+class CanSubscribeToAppointments(BasePermission):
+    """
+    A calendar feed exposes what the user can already list.
+    """
+    def has_permission(self, request, view):
+        return request.user.has_perm('appointments.view_appointment')
+
+
+class CanManageSchedules(BasePermission):
+    """
+    Model permissions on the model of the view's serializer: working hours,
+    time off, waitlist entries.
+    """
+    actions = {'GET': 'view', 'POST': 'add', 'PUT': 'change', 'PATCH': 'change', 'DELETE': 'delete'}
+
+    def has_permission(self, request, view):
+        action = self.actions.get(request.method)
+        if action is None:
+            return False
+        model = view.get_serializer_class().Meta.model
+        return request.user.has_perm(f'{model._meta.app_label}.{action}_{model._meta.model_name}')
+
+
+class CanAnswerWaitlistOffers(BasePermission):
+    """
+    Offers are answered on behalf of the patient by whoever manages the waitlist.
+    """
+    def has_permission(self, request, view):
+        if request.method == 'GET':
+            return request.user.has_perm('appointments.view_waitlistentry')
+        return (request.user.has_perm('appointments.change_waitlistentry')
+                and request.user.has_perm('appointments.add_appointment'))
+
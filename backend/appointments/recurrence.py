@@ -0,0 +1,116 @@
+import bisect
+import calendar
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from reminders.scheduling import sync_on_commit
+from .availability import bitmap_days, get_bookings, merge_busy, refresh_on_commit
+from .calendar_feed import touch_on_commit
+from .live import notify_on_commit
+from .models import Appointment, AppointmentSeries
+from .serializers import EXCLUSION_VIOLATION
+
+# Upper bound on the occurrences of one series, whatever count/until say
+MAX_SERIES_OCCURRENCES = 104
+
+
+def _add_months(value, months):
+    """
+    Same day `months` later, None when that month has no such day (the 31st).
+    """
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    if value.day > calendar.monthrange(year, month)[1]:
+        return None
+    return value.replace(year=year, month=month)
+
+
+def expand_occurrences(start_time, end_time, frequency, interval=1, count=None, until=None, tz=None):
+    """
+    (start, end) of every occurrence of the rule, first one included, at most
+    `count` of them and none starting after the `until` date.
+
+    Occurrences keep the wall clock time of the first one in `tz` (the clinic's
+    timezone during a request): a 9:00 visit stays at 9:00 across DST changes.
+    Monthly occurrences skip the months without the day, like RFC 5545.
+    """
+    tz = tz or timezone.get_current_timezone()
+    local_start = timezone.localtime(start_time, tz).replace(tzinfo=None)
+    duration = end_time - start_time
+    limit = min(count or MAX_SERIES_OCCURRENCES, MAX_SERIES_OCCURRENCES)
+    occurrences = []
+    step = 0
+    while len(occurrences) < limit:
+        if frequency == AppointmentSeries.Frequency.MONTHLY:
+            local = _add_months(local_start, step * interval)
+        else:
+            days = interval if frequency == AppointmentSeries.Frequency.DAILY else 7 * interval
+            local = local_start + timedelta(days=step * days)
+        step += 1
+        if local is None:
+            continue
+        if until is not None and local.date() > until:
+            break
+        start = timezone.make_aware(local, tz)
+        occurrences.append((start, start + duration))
+    return occurrences
+
+
+def find_conflicts(busy, occurrences):
+    """
+    Indexes of the occurrences overlapping one of the merged `busy` intervals,
+    or an earlier occurrence of the same series. Intervals are half-open.
+    """
+    starts = [start for start, _ in busy]
+    conflicts = set()
+    booked = []
+    for index, (start, end) in enumerate(occurrences):
+        # The last busy interval starting before the end of the occurrence is the only candidate
+        position = bisect.bisect_left(starts, end) - 1
+        if position >= 0 and busy[position][1] > start:
+            conflicts.add(index)
+        elif any(start < other_end and other_start < end for other_start, other_end in booked):
+            conflicts.add(index)
+        else:
+            booked.append((start, end))
+    return conflicts
+
+
+def book_series(series, start_time, end_time, retries=1):
+    """
+    Expands the rule of a saved `series` and books every occurrence that is
+    free: one range query over the whole series for the dentist's bookings,
+    one bulk_create for the free occurrences.
+
+    Returns [(start, end, appointment or None)], None for the occurrences that
+    conflict. A booking committed concurrently makes the exclusion constraint
+    reject the batch, the check is then redone against fresh bookings.
+    """
+    occurrences = expand_occurrences(start_time, end_time, series.frequency, series.interval,
+                                     series.count, series.until)
+    if not occurrences:
+        return []
+    for attempt in range(retries + 1):
+        busy = merge_busy(get_bookings(Appointment.objects.filter(dentist=series.dentist),
+                                       occurrences[0][0], occurrences[-1][1]))
+        conflicts = find_conflicts(busy, occurrences)
+        appointments = {
+            index: Appointment(patient=series.patient, dentist=series.dentist, start_time=start,
+                               end_time=end, notes=series.notes, tenant=series.tenant, series=series)
+            for index, (start, end) in enumerate(occurrences) if index not in conflicts
+        }
+        try:
+            with transaction.atomic():
+                Appointment.objects.bulk_create(appointments.values())
+            break
+        except IntegrityError as e:
+            if getattr(e.__cause__, 'sqlstate', None) != EXCLUSION_VIOLATION or attempt == retries:
+                raise
+    # bulk_create sends no post_save, see appointments/signals.py
+    refresh_on_commit(bitmap_days((series.dentist_id, appointment.start_time, appointment.end_time)
+                                  for appointment in appointments.values()))
+    sync_on_commit(appointment.pk for appointment in appointments.values())
+    notify_on_commit(appointment.pk for appointment in appointments.values())
+    touch_on_commit([series.dentist_id])
+    return [(start, end, appointments.get(index)) for index, (start, end) in enumerate(occurrences)]
@@ -1,6 +1,32 @@
 from rest_framework import serializers
-from .models import Appointment
+from .models import (Appointment, AppointmentSeries, CalendarFeed, TimeOff, WaitlistEntry, WaitlistOffer,
+                     WorkingHours)
+from django.urls import reverse
+from users.models import User
 from django.utils import timezone
+from django.db import IntegrityError, transaction
+from rest_framework.settings import api_settings
+from contextlib import contextmanager
+from datetime import timedelta
+
+MAX_BULK_STATUS_IDS = 500
+OVERLAP_ERROR = "This time slot overlaps with another appointment"
+EXCLUSION_VIOLATION = '23P01'
+
+
+@contextmanager
+def overlap_as_validation_error():
+    """
+    Turns a violation of the appointment_no_overlap constraint into the usual
+    validation error. The savepoint keeps an outer transaction usable.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as e:
+        if getattr(e.__cause__, 'sqlstate', None) != EXCLUSION_VIOLATION:
+            raise
+        raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [OVERLAP_ERROR]})
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -26,6 +52,11 @@ class AppointmentSerializer(serializers.ModelSerializer):
             if not all([start_time, end_time, dentist]):
                 raise serializers.ValidationError("start_time, end_time, and dentist are required for new appointments")
 
+        # The dentist was fetched by the field already, this costs no query
+        request = self.context.get('request')
+        if 'dentist' in data and request is not None and data['dentist'].tenant_id != request.tenant.pk:
+            raise serializers.ValidationError({'dentist': "Unknown dentist"})
+
         # Ensure timezone awareness only if times are provided
         if 'start_time' in data and not timezone.is_aware(data['start_time']):
             data['start_time'] = timezone.make_aware(data['start_time'])
@@ -37,21 +68,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
             if end_time <= start_time:
                 raise serializers.ValidationError("End time must be after start time")
 
-            # Check for overlapping appointments
-            overlapping_query = Appointment.objects.filter(
-                dentist=dentist,
-                start_time__lt=end_time,
-                end_time__gt=start_time
-            )
-            
-            # Exclude current instance if this is an update
-            if instance:
-                overlapping_query = overlapping_query.exclude(id=instance.id)
-            
-            if overlapping_query.exists():
-                raise serializers.ValidationError(
-                    "This time slot overlaps with another appointment"
-                )
+            # Overlaps are rejected by the appointment_no_overlap exclusion constraint
+            # when saving, see create()/update()
 
         # Validate status changes if status is being updated
         # if 'status' in data:
@@ -61,18 +79,162 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
         return data
 
+    def create(self, validated_data):
+        with overlap_as_validation_error():
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with overlap_as_validation_error():
+            return super().update(instance, validated_data)
+
     # def _validate_status_transition(self, current_status, new_status):
     #     """
-    #     Validate that the status transition is allowed
+    #     Validate that the status transition is allowed (STATUS_TRANSITIONS of transitions.py)
     #     """
-    #     allowed_transitions = {
-    #         'SCHEDULED': ['CONFIRMED', 'CANCELLED'],
-    #         'CONFIRMED': ['COMPLETED', 'CANCELLED'],
-    #         'CANCELLED': [],  # No transitions allowed from cancelled
-    #         'COMPLETED': []   # No transitions allowed from completed
-    #     }
-
-    #     if new_status not in allowed_transitions.get(current_status, []):
+    #     if new_status not in STATUS_TRANSITIONS.get(current_status, []):
     #         raise serializers.ValidationError({
     #             'status': f"Cannot transition from {current_status} to {new_status}"
-    #         })
\ No newline at end of file
+    #         })
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    Input of POST /appointments/bulk_status/, see appointments/transitions.py.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                max_length=MAX_BULK_STATUS_IDS)
+    status = serializers.ChoiceField(choices=Appointment.Status.choices)
+
+
+class TenantDentistField(serializers.PrimaryKeyRelatedField):
+    """
+    A user of the request's tenant.
+    """
+    def get_queryset(self):
+        return User.objects.filter(tenant=self.context['request'].tenant)
+
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    """
+    Input of POST /appointments/series/: the first occurrence (start_time,
+    end_time) and the recurrence rule, ending after `count` occurrences or on
+    the `until` date. See appointments/recurrence.py.
+    """
+    dentist = TenantDentistField()
+    start_time = serializers.DateTimeField(write_only=True)
+    end_time = serializers.DateTimeField(write_only=True)
+
+    class Meta:
+        model = AppointmentSeries
+        fields = ['id', 'patient', 'dentist', 'start_time', 'end_time', 'frequency',
+                  'interval', 'count', 'until', 'notes', 'created_at']
+
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("End time must be after start time")
+        if data['end_time'] - data['start_time'] >= timedelta(days=1):
+            raise serializers.ValidationError("An occurrence can't last a day or more")
+        if not data.get('count') and not data.get('until'):
+            raise serializers.ValidationError("Either count or until is required")
+        if data.get('interval', 1) < 1:
+            raise serializers.ValidationError({'interval': "Must be at least 1"})
+        if data.get('until') and data['until'] < timezone.localdate(data['start_time']):
+            raise serializers.ValidationError({'until': "Must not be before the first occurrence"})
+        return data
+
+
+class CalendarFeedSerializer(serializers.ModelSerializer):
+    """
+    `url` is what goes in the calendar app. No dentist: the whole clinic.
+    """
+    dentist = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False, allow_null=True)
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CalendarFeed
+        fields = ['id', 'dentist', 'url', 'created_at']
+
+    def get_url(self, feed):
+        return self.context['request'].build_absolute_uri(reverse('calendar-feed', args=[feed.token]))
+
+    def validate_dentist(self, dentist):
+        if dentist is not None and dentist.tenant_id != self.context['request'].tenant.pk:
+            raise serializers.ValidationError("Unknown dentist")
+        return dentist
+
+
+class WorkingHoursSerializer(serializers.ModelSerializer):
+    dentist = TenantDentistField()
+
+    class Meta:
+        model = WorkingHours
+        fields = ['id', 'dentist', 'weekday', 'start_time', 'end_time']
+
+    def validate(self, data):
+        instance = self.instance
+        dentist = data.get('dentist', instance and instance.dentist)
+        weekday = data.get('weekday', instance and instance.weekday)
+        start_time = data.get('start_time', instance and instance.start_time)
+        end_time = data.get('end_time', instance and instance.end_time)
+        if end_time <= start_time:
+            raise serializers.ValidationError("End time must be after start time")
+        overlapping = WorkingHours.objects.filter(dentist=dentist, weekday=weekday,
+                                                  start_time__lt=end_time, end_time__gt=start_time)
+        if instance:
+            overlapping = overlapping.exclude(pk=instance.pk)
+        if overlapping.exists():
+            raise serializers.ValidationError("These hours overlap other working hours of the day")
+        return data
+
+
+class TimeOffSerializer(serializers.ModelSerializer):
+    # No dentist: the whole clinic is closed
+    dentist = TenantDentistField(required=False, allow_null=True)
+
+    class Meta:
+        model = TimeOff
+        fields = ['id', 'dentist', 'start_time', 'end_time', 'reason']
+
+    def validate(self, data):
+        start_time = data.get('start_time', self.instance and self.instance.start_time)
+        end_time = data.get('end_time', self.instance and self.instance.end_time)
+        if end_time <= start_time:
+            raise serializers.ValidationError("End time must be after start time")
+        return data
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    # No dentist: any dentist of the clinic
+    dentist = TenantDentistField(required=False, allow_null=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'patient', 'dentist', 'duration', 'available_from', 'available_until',
+                  'earliest_time', 'latest_time', 'status', 'notes', 'created_at']
+        read_only_fields = ['status']
+
+    def validate(self, data):
+        instance = self.instance
+        available_from = data.get('available_from', instance and instance.available_from)
+        available_until = data.get('available_until', instance and instance.available_until)
+        duration = data.get('duration', instance and instance.duration)
+        if not duration:
+            raise serializers.ValidationError({'duration': "Must be at least one minute"})
+        if available_until - available_from < timedelta(minutes=duration):
+            raise serializers.ValidationError("The availability window is shorter than the duration")
+        earliest_time = data.get('earliest_time', instance and instance.earliest_time)
+        latest_time = data.get('latest_time', instance and instance.latest_time)
+        if earliest_time and latest_time and latest_time <= earliest_time:
+            raise serializers.ValidationError("latest_time must be after earliest_time")
+        return data
+
+
+class WaitlistOfferSerializer(serializers.ModelSerializer):
+    patient = serializers.IntegerField(source='entry.patient_id', read_only=True)
+
+    class Meta:
+        model = WaitlistOffer
+        fields = ['id', 'entry', 'patient', 'dentist', 'start_time', 'end_time', 'status',
+                  'expires_at', 'appointment', 'created_at']
+        read_only_fields = fields
+
@@ -0,0 +1,135 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django_tenants.utils import schema_context
+from patients.models import Patient
+from tenants.models import Tenant
+from users.models import User
+from .availability import bitmap_days, clear_schedules, refresh_on_commit, refresh_stored_bitmaps
+from .calendar_feed import touch_on_commit
+from .live import notify_on_commit
+from .models import Appointment, TimeOff, WorkingHours
+from .waitlist import match_on_commit
+
+
+def _busy_interval(instance):
+    """
+    (dentist_id, start, end) the instance takes from the dentist's availability,
+    None when it takes nothing. Reads __dict__: never loads a deferred field.
+    """
+    values = instance.__dict__
+    if isinstance(instance, Appointment) and values.get('status') == Appointment.Status.CANCELLED:
+        return None
+    interval = (values.get('dentist_id'), values.get('start_time'), values.get('end_time'))
+    return interval if all(value is not None for value in interval[1:]) else None
+
+
+def _changed_days(instance, created=False):
+    """
+    Days of the interval the instance was loaded with and of its current one.
+    """
+    before = None if created else getattr(instance, '_availability_interval', None)
+    after = _busy_interval(instance)
+    instance._availability_interval = after
+    if before == after and not created:
+        return set()
+    return bitmap_days([interval for interval in (before, after) if interval is not None])
+
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=TimeOff)
+def remember_interval(sender, instance, **kwargs):
+    instance._availability_interval = _busy_interval(instance)
+    # A cancelled appointment takes no interval, but is still on its dentist's feed
+    instance._feed_dentist_id = instance.__dict__.get('dentist_id')
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, '_availability_interval', None)
+    refresh_on_commit(_changed_days(instance, created))
+    notify_on_commit([instance.pk])
+    touch_on_commit({instance.dentist_id, getattr(instance, '_feed_dentist_id', None)} - {None})
+    instance._feed_dentist_id = instance.dentist_id
+    if before is not None and instance.status == Appointment.Status.CANCELLED:
+        match_on_commit([before])
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    notify_on_commit([instance.pk])
+    touch_on_commit([instance.dentist_id])
+    interval = _busy_interval(instance)
+    if interval is not None:
+        refresh_on_commit(bitmap_days([interval]))
+
+
+def _time_off_changed(days):
+    refresh_on_commit({(dentist_id, day) for dentist_id, day in days if dentist_id is not None})
+    # Clinic-wide time off has no dentist, it changes the stored days of everyone
+    clinic_days = {day for dentist_id, day in days if dentist_id is None}
+    if clinic_days:
+        def invalidate():
+            with schema_context(schema_name):
+                refresh_stored_bitmaps(day__in=clinic_days)
+
+        schema_name = connection.schema_name
+        transaction.on_commit(invalidate)
+
+
+def _names(instance):
+    # From __dict__: never loads a deferred field
+    return instance.__dict__.get('first_name'), instance.__dict__.get('last_name')
+
+
+@receiver(post_init, sender=Patient)
+@receiver(post_init, sender=User)
+def remember_names(sender, instance, **kwargs):
+    instance._feed_names = _names(instance)
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, **kwargs):
+    # The events of the feeds are named after the patient
+    if not created and _names(instance) != instance._feed_names:
+        touch_on_commit()
+    instance._feed_names = _names(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    # The events of the feeds carry their dentist's name. Saved from the public
+    # schema, the feeds are in the tenant's; last_login saves are left out.
+    names_saved = update_fields is None or {'first_name', 'last_name'} & set(update_fields)
+    if created or not names_saved or instance.tenant_id is None or _names(instance) == instance._feed_names:
+        return
+    instance._feed_names = _names(instance)
+    schema_name = Tenant.objects.filter(pk=instance.tenant_id).values_list('schema_name', flat=True).first()
+    if schema_name is not None:
+        with schema_context(schema_name):
+            touch_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=TimeOff)
+def time_off_saved(sender, instance, created, **kwargs):
+    _time_off_changed(_changed_days(instance, created))
+
+
+@receiver(post_delete, sender=TimeOff)
+def time_off_deleted(sender, instance, **kwargs):
+    interval = _busy_interval(instance)
+    if interval is not None:
+        _time_off_changed(bitmap_days([interval]))
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def working_hours_changed(sender, instance, **kwargs):
+    def invalidate():
+        clear_schedules(schema_name)
+        # Every stored day of the dentist may change
+        with schema_context(schema_name):
+            refresh_stored_bitmaps(dentist_id=instance.dentist_id)
+
+    schema_name = connection.schema_name
+    transaction.on_commit(invalidate)
@@ -1,3 +1,114 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from patients.models import Patient
+from tenants.provisioning import create_tenant
+from tenants.testing import skip_without_tenant_schemas
+from users.models import User
+from .availability import day_bounds
+from .models import Appointment, WaitlistEntry
+from .views import AppointmentViewSet
+from .waitlist import first_start
+
+TZ = ZoneInfo('Europe/Bucharest')
+
+
+def local(day, hour, minute=0):
+    return datetime(2026, 3, day, hour, minute, tzinfo=TZ)
+
+
+class FirstStartTests(SimpleTestCase):
+    def setUp(self):
+        self.entry = WaitlistEntry(duration=30, available_from=local(1, 0), available_until=local(31, 0),
+                                   earliest_time=time(10), latest_time=time(12))
+
+    def test_block_starting_before_earliest_time(self):
+        self.assertEqual(first_start(self.entry, local(10, 9), local(10, 11), TZ), local(10, 10))
+
+    def test_block_too_short_after_earliest_time(self):
+        self.assertIsNone(first_start(self.entry, local(10, 9), local(10, 10, 20), TZ))
+
+    def test_block_past_latest_time_moves_to_next_day(self):
+        self.assertEqual(first_start(self.entry, local(10, 11, 45), local(11, 18), TZ), local(11, 10))
+
+    def test_block_before_available_from(self):
+        self.entry.available_from = local(10, 10, 15)
+        self.assertEqual(first_start(self.entry, local(10, 9), local(10, 11), TZ), local(10, 10, 15))
+
+    def test_entry_without_hours_of_the_day(self):
+        self.entry.earliest_time = self.entry.latest_time = None
+        self.assertEqual(first_start(self.entry, local(10, 7), local(10, 8), TZ), local(10, 7))
+
+
+class AppointmentRangePlanTests(TestCase):
+    """
+    The date-range queries of the appointments API scan an index, not the
+    table, on a calendar large enough for the planner to tell them apart.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Before the class transaction is opened, tearDownClass doesn't run on a skip
+        skip_without_tenant_schemas()
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = create_tenant(name='Clinic')
+        cls.addClassCleanup(connection.set_schema_to_public)
+        cls.dentists = [User.objects.create_user(f'dentist{i}@example.com', 'Ada', 'Lovelace', 'secret-password',
+                                                 tenant=cls.tenant, role=User.Role.DENTIST) for i in range(3)]
+        connection.set_tenant(cls.tenant)
+        patient = Patient.objects.create(first_name='Grace', last_name='Hopper', date_of_birth=date(1980, 1, 1),
+                                         phone_number='+212600000000', dentist=cls.dentists[0], tenant=cls.tenant)
+        # Three years of back to back half hours, 8 a day per dentist
+        statuses = Appointment.Status.values
+        appointments = []
+        for day in range(3 * 365):
+            for slot in range(8):
+                start = datetime(2024, 1, 1, 9, tzinfo=dt_timezone.utc) + timedelta(days=day, minutes=30 * slot)
+                for dentist in cls.dentists:
+                    appointments.append(Appointment(
+                        patient=patient, dentist=dentist, start_time=start, end_time=start + timedelta(minutes=30),
+                        status=statuses[(day + slot) % len(statuses)], tenant=cls.tenant,
+                    ))
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Appointment._meta.db_table}')
+
+    def setUp(self):
+        connection.set_tenant(self.tenant)
+
+    def list_queryset(self, **params):
+        request = APIRequestFactory().get('/api/appointments/', {'start': '2025-03-03', 'end': '2025-03-09', **params})
+        request.tenant = self.tenant
+        view = AppointmentViewSet(request=Request(request), format_kwarg=None)
+        return view.get_queryset().order_by(*AppointmentViewSet.keyset_ordering)[:10]
+
+    def assertIndexScan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertNotIn(f'Seq Scan on {Appointment._meta.db_table}', plan)
+        self.assertRegex(plan, r'Index (Only )?Scan', plan)
+
+    def test_calendar_week(self):
+        self.assertIndexScan(self.list_queryset())
+
+    def test_calendar_week_of_a_dentist(self):
+        self.assertIndexScan(self.list_queryset(dentist=self.dentists[0].pk))
+
+    def test_week_by_status(self):
+        week_start, week_end = day_bounds(date(2025, 3, 3), date(2025, 3, 9))
+        self.assertIndexScan(Appointment.objects.filter(status=Appointment.Status.SCHEDULED,
+                                                        start_time__gte=week_start, start_time__lt=week_end))
+
+    def test_availability_bookings(self):
+        week_start, week_end = day_bounds(date(2025, 3, 3), date(2025, 3, 9))
+        self.assertIndexScan(Appointment.objects.filter(dentist=self.dentists[0])
+                             .filter(start_time__lt=week_end, end_time__gt=week_start)
+                             .exclude(status=Appointment.Status.CANCELLED))
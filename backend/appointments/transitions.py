@@ -0,0 +1,77 @@
+from django.db import connection
+from django.utils import timezone
+from reminders.scheduling import sync_on_commit
+from .availability import bitmap_days, refresh_on_commit
+from .calendar_feed import touch_on_commit
+from .live import notify_on_commit
+from .models import Appointment
+from .waitlist import match_on_commit
+
+Status = Appointment.Status
+
+# Statuses an appointment can move to from each status
+STATUS_TRANSITIONS = {
+    Status.SCHEDULED: [Status.CONFIRMED, Status.CANCELLED],
+    Status.CONFIRMED: [Status.COMPLETED, Status.CANCELLED],
+    Status.CANCELLED: [],  # No transitions allowed from cancelled
+    Status.COMPLETED: [],  # No transitions allowed from completed
+}
+
+# Outcomes of bulk_transition, per id
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+INVALID_TRANSITION = 'invalid_transition'
+CONFLICT = 'conflict'
+
+
+def bulk_transition(queryset, ids, new_status):
+    """
+    Moves the appointments `ids` of `queryset` to `new_status` with one SELECT
+    of their current status and one UPDATE ... WHERE id = ANY(...).
+
+    Transitions are validated in memory against STATUS_TRANSITIONS. The UPDATE
+    re-checks the status of every row: one changed in between to a status the
+    transition isn't allowed from is left alone and reported as a conflict.
+
+    Returns {id: (outcome, status)}, status being the one the row ends with
+    (None when not found).
+    """
+    current = dict(queryset.filter(id__in=ids).values_list('id', 'status'))
+    results = {}
+    allowed = []
+    for appointment_id in ids:
+        status = current.get(appointment_id)
+        if status is None:
+            results[appointment_id] = (NOT_FOUND, None)
+        elif status == new_status:
+            results[appointment_id] = (UNCHANGED, status)
+        elif new_status not in STATUS_TRANSITIONS.get(status, []):
+            results[appointment_id] = (INVALID_TRANSITION, status)
+        else:
+            allowed.append(appointment_id)
+
+    if allowed:
+        sources = [status for status, targets in STATUS_TRANSITIONS.items() if new_status in targets]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Appointment._meta.db_table} SET status = %s, updated_at = %s "
+                "WHERE id = ANY(%s) AND status = ANY(%s) RETURNING id, dentist_id, start_time, end_time",
+                [new_status, timezone.now(), allowed, sources],
+            )
+            rows = cursor.fetchall()
+        updated = {row[0] for row in rows}
+        notify_on_commit(updated)
+        touch_on_commit({row[1] for row in rows})
+        if new_status == Status.CANCELLED:
+            # Frees the slots, and a raw UPDATE sends no post_save (see appointments/signals.py)
+            refresh_on_commit(bitmap_days(row[1:] for row in rows))
+            match_on_commit([row[1:] for row in rows])
+            sync_on_commit(updated)
+        for appointment_id in allowed:
+            if appointment_id in updated:
+                results[appointment_id] = (UPDATED, new_status)
+            else:
+                results[appointment_id] = (CONFLICT, current[appointment_id])
+    # In the order of the request
+    return {appointment_id: results[appointment_id] for appointment_id in ids}
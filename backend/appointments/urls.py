@@ -1,8 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AppointmentViewSet
+from .views import (AppointmentViewSet, CalendarFeedViewSet, TimeOffViewSet, WaitlistEntryViewSet,
+                    WaitlistOfferViewSet, WorkingHoursViewSet)
+from .calendar_feed import calendar_feed
+from .live import appointment_events
 
 router = DefaultRouter()
+# Before the appointment detail route
+router.register(r'feeds', CalendarFeedViewSet, basename='calendar-feeds')
+router.register(r'working-hours', WorkingHoursViewSet, basename='working-hours')
+router.register(r'time-off', TimeOffViewSet, basename='time-off')
+router.register(r'waitlist', WaitlistEntryViewSet, basename='waitlist')
+router.register(r'waitlist-offers', WaitlistOfferViewSet, basename='waitlist-offers')
 router.register(r'', AppointmentViewSet, basename='appointment')  # /api/appointments/ is defined in core.urls and includes this file
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    # Anonymous, the token is the credential (see tenants/middleware.py)
+    path('ics/<str:token>.ics', calendar_feed, name='calendar-feed'),
+    # Server-Sent Events, needs the ASGI application (see appointments/live.py)
+    path('events/', appointment_events, name='appointment-events'),
+] + router.urls
\ No newline at end of file
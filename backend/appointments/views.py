@@ -1,18 +1,137 @@
 from django.shortcuts import render
 from .serializers import *
 from .permissions import *
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from datetime import datetime, timedelta
+from django.db.models import Q
 from django.utils import timezone
+from utils.pagination import KeysetPagination
+from .availability import day_bounds, first_available, get_availability
+from .recurrence import book_series
+from .transitions import bulk_transition
+from .waitlist import accept_offer, decline_offer, withdraw_entry
+from users.models import User
+
+MAX_AVAILABILITY_DAYS = 366
+MAX_FIRST_AVAILABLE = 50
 
 
 # Create your views here.
+class CalendarFeedViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.DestroyModelMixin,
+                          viewsets.GenericViewSet):
+    """
+    The iCalendar subscriptions of the current user, deleting one revokes its URL.
+    The feeds themselves are served by calendar_feed.calendar_feed.
+    """
+    serializer_class = CalendarFeedSerializer
+    permission_classes = [CanSubscribeToAppointments]
+
+    def get_queryset(self):
+        return CalendarFeed.objects.filter(created_by=self.request.user).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class WorkingHoursViewSet(viewsets.ModelViewSet):
+    """
+    Weekly working hours of the dentists, ?dentist= to filter.
+    """
+    serializer_class = WorkingHoursSerializer
+    permission_classes = [CanManageSchedules]
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = WorkingHours.objects.all()
+        dentist_id = self.request.query_params.get('dentist')
+        if dentist_id:
+            queryset = queryset.filter(dentist_id=dentist_id)
+        return queryset
+
+
+class TimeOffViewSet(viewsets.ModelViewSet):
+    """
+    Time off of the dentists and of the clinic. ?dentist= to filter (the
+    clinic's time off is included), ?start= and ?end= (YYYY-MM-DD) for a range.
+    """
+    serializer_class = TimeOffSerializer
+    permission_classes = [CanManageSchedules]
+
+    def get_queryset(self):
+        queryset = TimeOff.objects.all()
+        dentist_id = self.request.query_params.get('dentist')
+        if dentist_id:
+            queryset = queryset.filter(Q(dentist_id=dentist_id) | Q(dentist__isnull=True))
+        start_date = self.request.query_params.get('start')
+        end_date = self.request.query_params.get('end')
+        if start_date and end_date:
+            try:
+                range_start, range_end = day_bounds(datetime.strptime(start_date, '%Y-%m-%d').date(),
+                                                    datetime.strptime(end_date, '%Y-%m-%d').date())
+            except ValueError:
+                raise ValidationError({"error": "start and end must be YYYY-MM-DD"})
+            queryset = queryset.filter(start_time__lt=range_end, end_time__gt=range_start)
+        return queryset
+
+
+class WaitlistEntryViewSet(viewsets.ModelViewSet):
+    """
+    Patients waiting for an earlier slot, ?status= and ?dentist= to filter.
+    Cancelled slots are offered to them automatically (appointments/waitlist.py).
+    """
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [CanManageSchedules]
+
+    def get_queryset(self):
+        queryset = WaitlistEntry.objects.select_related('patient')
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter.upper())
+        dentist_id = self.request.query_params.get('dentist')
+        if dentist_id:
+            queryset = queryset.filter(dentist_id=dentist_id)
+        return queryset
+
+    def perform_destroy(self, instance):
+        withdraw_entry(instance)
+
+
+class WaitlistOfferViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Offers made from cancelled slots, ?status= to filter (PENDING to call the
+    patients). accept books the appointment, decline passes the slot on.
+    """
+    serializer_class = WaitlistOfferSerializer
+    permission_classes = [CanAnswerWaitlistOffers]
+
+    def get_queryset(self):
+        queryset = WaitlistOffer.objects.select_related('entry')
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter.upper())
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        offer = accept_offer(self.get_object(), request.tenant)
+        return Response(WaitlistOfferSerializer(offer).data)
+
+    @action(detail=True, methods=['post'])
+    def decline(self, request, pk=None):
+        offer = decline_offer(self.get_object())
+        offer.refresh_from_db()
+        return Response(WaitlistOfferSerializer(offer).data)
+
+
 class AppointmentViewSet(viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     permission_classes = [CanManageAppointments]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('start_time', 'id')
     
     def get_queryset(self):
         queryset = Appointment.objects.filter(
@@ -25,10 +144,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         view_type = self.request.query_params.get('view', 'month')
         
         if start_date and end_date:
-            # Convert string dates to datetime
-            start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            end_date = datetime.strptime(end_date, '%Y-%m-%d')
-            queryset = queryset.filter(start_time__date__range=[start_date, end_date])
+            try:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValidationError({"error": "start and end must be YYYY-MM-DD"})
+            # Days of the clinic's timezone, as a range on start_time the indexes can serve
+            range_start, range_end = day_bounds(start_date, end_date)
+            queryset = queryset.filter(start_time__gte=range_start, start_time__lt=range_end)
         
         # Filter by dentist if specified
         dentist_id = self.request.query_params.get('dentist', None)
@@ -37,10 +160,15 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             
         return queryset.select_related('patient', 'dentist')
 
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.tenant)
+
     @action(detail=False, methods=['get'])
     def calendar_slots(self, request):
         """
-        Return available time slots for a given date range
+        Return available time slots for a given date range.
+        Optional: slot (length in minutes, default 60), step (minutes between
+        two slot starts, defaults to slot). See appointments/availability.py.
         """
         start_date = request.query_params.get('start')
         end_date = request.query_params.get('end')
@@ -51,46 +179,111 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 {"error": "start, end, and dentist parameters are required"}, 
                 status=400
             )
-            
-        # Convert string dates to timezone-aware datetime
-        start_date_dt = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
-        end_date_dt = timezone.make_aware(datetime.strptime(end_date, '%Y-%m-%d'))
-        
-        # Get booked appointments (these are already timezone-aware)
-        booked_slots = Appointment.objects.filter(
-            tenant=request.tenant,
-            dentist_id=dentist_id,
-            start_time__date__range=[start_date, end_date]
-        ).values('start_time', 'end_time')
-        
-        # Generate all possible slots
-        all_slots = []
-        current_date = start_date_dt
-        
-        while current_date <= end_date_dt:
-            if current_date.weekday() < 5:  # Monday to Friday
-                for hour in range(9, 17):  # 9 AM to 5 PM
-                    # Create timezone-aware slot times
-                    slot_start = timezone.make_aware(
-                        datetime.combine(current_date.date(), datetime.min.time().replace(hour=hour))
-                    )
-                    slot_end = slot_start + timedelta(minutes=60)
-                    
-                    # Check if slot is available (booked slots are already timezone-aware)
-                    is_available = not any(
-                        booked['start_time'] <= slot_start <= booked['end_time'] or
-                        booked['start_time'] <= slot_end <= booked['end_time'] or
-                        (slot_start <= booked['start_time'] and slot_end >= booked['end_time'])
-                        for booked in booked_slots
-                    )
-                    
-                    if is_available:
-                        all_slots.append({
-                            'start': slot_start.isoformat(),
-                            'end': slot_end.isoformat(),
-                            'available': True
-                        })
-                        
-            current_date += timedelta(days=1)
-            
-        return Response(all_slots)
\ No newline at end of file
+
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            dentist_id = int(dentist_id)
+            slot_length = timedelta(minutes=int(request.query_params.get('slot', 60)))
+            step = timedelta(minutes=int(request.query_params.get('step', slot_length.total_seconds() // 60)))
+        except ValueError:
+            return Response({"error": "start and end must be YYYY-MM-DD, dentist an id, slot and step minutes"}, status=400)
+        if slot_length <= timedelta(0) or step <= timedelta(0):
+            return Response({"error": "slot and step must be positive"}, status=400)
+        if (end_date - start_date).days > MAX_AVAILABILITY_DAYS:
+            return Response({"error": f"The range can't exceed {MAX_AVAILABILITY_DAYS} days"}, status=400)
+        # Before anything is computed: the bitmaps of the dentist are stored by this GET
+        if not User.objects.filter(tenant=request.tenant, id=dentist_id).exists():
+            return Response({"error": "Unknown dentist"}, status=404)
+
+        slots = get_availability(dentist_id, start_date, end_date, slot_length, step)
+        return Response([
+            {'start': slot_start.isoformat(), 'end': slot_end.isoformat(), 'available': True}
+            for slot_start, slot_end in slots
+        ])
+
+    @action(detail=False, methods=['get'])
+    def first_available(self, request):
+        """
+        Earliest free slots across the dentists of the clinic.
+        Params: duration (minutes, required), start/end (YYYY-MM-DD, default today
+        and 30 days later), count (default 5), dentists (comma separated ids,
+        default every admin and dentist), step (minutes, default 15).
+        """
+        today = timezone.localdate()
+        try:
+            duration = timedelta(minutes=int(request.query_params['duration']))
+            step = timedelta(minutes=int(request.query_params.get('step', 15)))
+            count = min(int(request.query_params.get('count', 5)), MAX_FIRST_AVAILABLE)
+            start_date = request.query_params.get('start')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else today
+            end_date = request.query_params.get('end')
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else start_date + timedelta(days=30)
+            dentists = request.query_params.get('dentists')
+            dentist_ids = [int(dentist_id) for dentist_id in dentists.split(',')] if dentists else None
+        except KeyError:
+            return Response({"error": "duration parameter is required"}, status=400)
+        except ValueError:
+            return Response({"error": "start and end must be YYYY-MM-DD, duration, step, count and dentists integers"}, status=400)
+        if duration <= timedelta(0) or step <= timedelta(0) or count <= 0:
+            return Response({"error": "duration, step and count must be positive"}, status=400)
+        if (end_date - start_date).days > MAX_AVAILABILITY_DAYS:
+            return Response({"error": f"The range can't exceed {MAX_AVAILABILITY_DAYS} days"}, status=400)
+
+        dentists = User.objects.filter(tenant=request.tenant, is_active=True,
+                                       role__in=[User.Role.ADMIN, User.Role.DENTIST])
+        if dentist_ids is not None:
+            dentists = dentists.filter(id__in=dentist_ids)
+        slots = first_available(
+            list(dentists.values_list('id', flat=True)),
+            start_date, end_date, duration, count, step=step, not_before=timezone.now()
+        )
+        return Response([
+            {'start': slot_start.isoformat(), 'end': slot_end.isoformat(), 'dentist': dentist_id}
+            for slot_start, slot_end, dentist_id in slots
+        ])
+
+    @action(detail=False, methods=['post'])
+    def series(self, request):
+        """
+        Books a recurring series: the first occurrence (start_time, end_time),
+        frequency (DAILY, WEEKLY, MONTHLY), interval, count and/or until.
+        Occurrences that conflict with existing bookings are skipped, the
+        response says which ones were booked.
+        """
+        serializer = AppointmentSeriesSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        start_time, end_time = data.pop('start_time'), data.pop('end_time')
+        with overlap_as_validation_error():
+            series = AppointmentSeries.objects.create(tenant=request.tenant, **data)
+            occurrences = book_series(series, start_time, end_time)
+        return Response({
+            **AppointmentSeriesSerializer(series, context={'request': request}).data,
+            'booked': sum(appointment is not None for _, _, appointment in occurrences),
+            'occurrences': [
+                {'start': start.isoformat(), 'end': end.isoformat(),
+                 'status': 'booked' if appointment else 'conflict',
+                 'appointment': appointment.id if appointment else None}
+                for start, end, appointment in occurrences
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """
+        Moves many appointments to one status: {"ids": [...], "status": "CONFIRMED"}.
+        Answers the outcome of every id: updated, unchanged, not_found,
+        invalid_transition or conflict, with the status the appointment ends with.
+        """
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_transition(
+            Appointment.objects.filter(tenant=request.tenant),
+            serializer.validated_data['ids'],
+            serializer.validated_data['status'],
+        )
+        return Response([
+            {'id': appointment_id, 'result': outcome, 'status': appointment_status}
+            for appointment_id, (outcome, appointment_status) in results.items()
+        ])
@@ -0,0 +1,266 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from rest_framework import serializers
+from .availability import get_bookings, get_time_off, merge_busy, tenant_timezone
+from .models import Appointment, WaitlistEntry, WaitlistOffer
+from .serializers import overlap_as_validation_error
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Waiting entries considered per batch of freed slots, oldest first
+MAX_CANDIDATES = 500
+
+
+def get_offer_ttl():
+    return timedelta(minutes=getattr(settings, 'WAITLIST_OFFER_TTL_MINUTES', 120))
+
+
+def subtract(intervals, busy):
+    """
+    Parts of the sorted, disjoint `intervals` not covered by the merged `busy` ones.
+    """
+    free = []
+    i = 0
+    for start, end in intervals:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        j = i
+        while start < end and j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > start:
+                free.append((start, busy[j][0]))
+            start = max(start, busy[j][1])
+            j += 1
+        if start < end:
+            free.append((start, end))
+    return free
+
+
+def _free_parts(slots, now):
+    """
+    {dentist_id: [(start, end), ...]}: the future parts of the freed slots,
+    adjacent ones merged (a sick day frees the whole day), minus what got
+    booked, taken off or offered to someone else since. One query each.
+    """
+    by_dentist = defaultdict(list)
+    for dentist_id, start, end in slots:
+        start = max(start, now)
+        if start < end:
+            by_dentist[dentist_id].append((start, end))
+    if not by_dentist:
+        return {}
+    range_start = min(start for intervals in by_dentist.values() for start, _ in intervals)
+    range_end = max(end for intervals in by_dentist.values() for _, end in intervals)
+    dentist_ids = list(by_dentist)
+
+    busy = get_time_off(dentist_ids, range_start, range_end)
+    for dentist_id, start, end in get_bookings(Appointment.objects.filter(dentist_id__in=dentist_ids),
+                                               range_start, range_end,
+                                               fields=('dentist_id', 'start_time', 'end_time')):
+        busy[dentist_id].append((start, end))
+    for dentist_id, start, end in (WaitlistOffer.objects
+                                   .filter(dentist_id__in=dentist_ids, status=WaitlistOffer.Status.PENDING,
+                                           start_time__lt=range_end, end_time__gt=range_start)
+                                   .values_list('dentist_id', 'start_time', 'end_time')):
+        busy[dentist_id].append((start, end))
+    return {dentist_id: subtract(merge_busy(intervals), merge_busy(busy[dentist_id]))
+            for dentist_id, intervals in by_dentist.items()}
+
+
+def _fits_day(entry, start, end, tz):
+    """
+    Whether the offer falls within the entry's hours of the day, if it has some.
+    """
+    if entry.earliest_time is None and entry.latest_time is None:
+        return True
+    local_start, local_end = timezone.localtime(start, tz), timezone.localtime(end, tz)
+    if local_start.date() != local_end.date():
+        return False
+    return ((entry.earliest_time is None or local_start.time() >= entry.earliest_time)
+            and (entry.latest_time is None or local_end.time() <= entry.latest_time))
+
+
+def first_start(entry, start, end, tz):
+    """
+    Earliest start of an offer to the entry within the free block [start, end):
+    inside its availability window and its hours of the day. Jumps to the
+    entry's earliest_time of the day, or of the next day, instead of giving up
+    on the block at the first start that doesn't fit. None when none does.
+    """
+    duration = timedelta(minutes=entry.duration)
+    start, end = max(start, entry.available_from), min(end, entry.available_until)
+    while start + duration <= end:
+        if _fits_day(entry, start, start + duration, tz):
+            return start
+        local = timezone.localtime(start, tz)
+        if entry.earliest_time is not None and local.time() < entry.earliest_time:
+            day = local.date()
+        else:
+            # Ends past latest_time or on the next day: the day is over
+            day = local.date() + timedelta(days=1)
+        start = timezone.make_aware(datetime.combine(day, entry.earliest_time or time.min), tz)
+    return None
+
+
+def match_slots(slots):
+    """
+    Offers the freed (dentist_id, start, end) slots to the waitlist, the whole
+    batch at once: one locked query for the candidate entries of every slot,
+    one for the previous offers, one bulk_create for the new ones.
+
+    Entries wanting the slot's dentist come before the ones accepting anyone,
+    then oldest first. A slot longer than an entry's duration keeps its end
+    for the next candidate. Entries locked by a concurrent matcher are
+    skipped (SKIP LOCKED), never offered twice. Returns the new offers.
+    """
+    now = timezone.now()
+    tz = tenant_timezone()
+    with transaction.atomic():
+        free = _free_parts(slots, now)
+        parts = sorted((start, end, dentist_id) for dentist_id, intervals in free.items()
+                       for start, end in intervals)
+        if not parts:
+            return []
+        dentist_ids = list(free)
+        range_start, range_end = parts[0][0], max(end for _, end, _ in parts)
+        longest = max(end - start for start, end, _ in parts)
+
+        candidates = list(WaitlistEntry.objects
+                          .select_for_update(skip_locked=True)
+                          .filter(Q(dentist_id__in=dentist_ids) | Q(dentist__isnull=True),
+                                  status=WaitlistEntry.Status.WAITING,
+                                  available_from__lt=range_end, available_until__gt=range_start,
+                                  duration__lte=longest.total_seconds() // 60)
+                          .order_by('created_at')[:MAX_CANDIDATES])
+        if not candidates:
+            return []
+        candidates.sort(key=lambda entry: (entry.dentist_id is None, entry.created_at))
+        # An entry that already declined or let expire a slot of this dentist here isn't asked again
+        asked = set(WaitlistOffer.objects
+                    .filter(entry__in=candidates, dentist_id__in=dentist_ids,
+                            start_time__lt=range_end, end_time__gt=range_start)
+                    .values_list('entry_id', 'dentist_id'))
+
+        offers = []
+        offered = set()
+        expires_at = now + get_offer_ttl()
+        for start, end, dentist_id in parts:
+            cursor = start
+            for entry in candidates:
+                if (entry.pk in offered or (entry.pk, dentist_id) in asked
+                        or entry.dentist_id not in (None, dentist_id)):
+                    continue
+                offer_start = first_start(entry, cursor, end, tz)
+                if offer_start is None:
+                    continue
+                offer_end = offer_start + timedelta(minutes=entry.duration)
+                offers.append(WaitlistOffer(entry=entry, dentist_id=dentist_id, start_time=offer_start,
+                                            end_time=offer_end, expires_at=expires_at))
+                offered.add(entry.pk)
+                cursor = offer_end
+        WaitlistOffer.objects.bulk_create(offers)
+        WaitlistEntry.objects.filter(pk__in=offered).update(status=WaitlistEntry.Status.OFFERED)
+    logger.info(f"Waitlist: {len(offers)} offers for {len(parts)} freed slots")
+    return offers
+
+
+def match_on_commit(slots):
+    """
+    match_slots() once the transaction commits, right away outside of one. The
+    slots freed by a whole transaction (a bulk cancellation) are matched in one batch.
+    """
+    db = connections[DEFAULT_DB_ALIAS]
+    pending = getattr(db, 'waitlist_pending', None)
+    if pending is None:
+        pending = db.waitlist_pending = defaultdict(list)
+    schema_name = db.schema_name
+    pending[schema_name].extend(slots)
+
+    def flush():
+        batch = pending.pop(schema_name, None)
+        if batch:
+            with schema_context(schema_name):
+                match_slots(batch)
+
+    transaction.on_commit(flush)
+
+
+def _release(offers, status):
+    """
+    Closes pending offers and puts their entries back on the waitlist, then
+    offers the slots again once committed.
+    """
+    WaitlistOffer.objects.filter(pk__in=[offer.pk for offer in offers]).update(status=status)
+    WaitlistEntry.objects.filter(pk__in=[offer.entry_id for offer in offers],
+                                 status=WaitlistEntry.Status.OFFERED).update(status=WaitlistEntry.Status.WAITING)
+    match_on_commit([(offer.dentist_id, offer.start_time, offer.end_time) for offer in offers])
+
+
+def expire_offers():
+    """
+    Expires the pending offers past expires_at and offers their slots to the
+    next candidates. Returns how many expired.
+    """
+    with transaction.atomic():
+        offers = list(WaitlistOffer.objects.select_for_update(skip_locked=True)
+                      .filter(status=WaitlistOffer.Status.PENDING, expires_at__lte=timezone.now()))
+        if offers:
+            _release(offers, WaitlistOffer.Status.EXPIRED)
+    return len(offers)
+
+
+def decline_offer(offer):
+    with transaction.atomic():
+        offer = WaitlistOffer.objects.select_for_update().get(pk=offer.pk)
+        if offer.status != WaitlistOffer.Status.PENDING:
+            raise serializers.ValidationError("This offer is no longer pending")
+        _release([offer], WaitlistOffer.Status.DECLINED)
+    return offer
+
+
+def withdraw_entry(entry):
+    """
+    Takes the entry off the waitlist, kept for the offers history. Its pending
+    offers are declined and their slots offered to the next entries.
+    """
+    with transaction.atomic():
+        # The entry first: a concurrent matcher skips it, accept_offer() waits for it
+        entry = WaitlistEntry.objects.select_for_update().get(pk=entry.pk)
+        offers = list(WaitlistOffer.objects.select_for_update()
+                      .filter(entry=entry, status=WaitlistOffer.Status.PENDING))
+        if offers:
+            _release(offers, WaitlistOffer.Status.DECLINED)
+        entry.status = WaitlistEntry.Status.WITHDRAWN
+        entry.save(update_fields=['status'])
+    return entry
+
+
+def accept_offer(offer, tenant):
+    """
+    Books the offered slot for the entry's patient. Raises a ValidationError
+    when the offer isn't pending anymore, its entry was withdrawn or booked,
+    or the slot got booked meanwhile.
+    """
+    with transaction.atomic():
+        # Locks the entry too
+        offer = WaitlistOffer.objects.select_for_update().select_related('entry').get(pk=offer.pk)
+        if (offer.status != WaitlistOffer.Status.PENDING or offer.expires_at <= timezone.now()
+                or offer.entry.status not in (WaitlistEntry.Status.WAITING, WaitlistEntry.Status.OFFERED)):
+            raise serializers.ValidationError("This offer is no longer available")
+        with overlap_as_validation_error():
+            appointment = Appointment.objects.create(
+                patient_id=offer.entry.patient_id, dentist_id=offer.dentist_id, start_time=offer.start_time,
+                end_time=offer.end_time, notes=offer.entry.notes, tenant=tenant,
+            )
+        offer.status = WaitlistOffer.Status.ACCEPTED
+        offer.appointment = appointment
+        offer.save(update_fields=['status', 'appointment'])
+        WaitlistEntry.objects.filter(pk=offer.entry_id).update(status=WaitlistEntry.Status.BOOKED)
+    return offer
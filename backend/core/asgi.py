@@ -3,6 +3,10 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serves the whole API like core/wsgi.py, and the long-lived streams that need an
+event loop: /api/appointments/events/ (see appointments/live.py). Run it with an
+ASGI server, e.g. gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -13,4 +17,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from appointments.live import listener  # noqa: E402, needs the app registry
+
+
+async def application(scope, receive, send):
+    # Django doesn't handle lifespan events, the shared LISTEN connection is closed on shutdown
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await listener.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    return await django_application(scope, receive, send)
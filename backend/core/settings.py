@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
-from django_tenants.middleware.main import TenantMainMiddleware
 import os
 import cloudinary
 
@@ -69,8 +68,10 @@ SHARED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.admin",
+    "django.contrib.postgres",
     "users",  # User model should exist in the public schema
     "tenants",  # Tenant model for tracking
+    "reminders",  # Appointment reminders of every tenant, see reminders/dispatch.py
     "rest_framework_simplejwt.token_blacklist",
 ]
 
@@ -90,8 +91,7 @@ MIDDLEWARE = [
     # Custom middleware comes first
     # Django's default middleware
     'corsheaders.middleware.CorsMiddleware',  # Add this line
-    'tenants.middleware.CustomTenantMiddleware',
-    'django_tenants.middleware.main.TenantMainMiddleware',
+    'tenants.middleware.CustomTenantMiddleware',  # Resolves the tenant and replaces TenantMainMiddleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +105,10 @@ MIDDLEWARE = [
 
 
 AUTH_USER_MODEL="users.User"
+
+# Permissions come from the user's role (see users/backends.py) instead of per-user rows
+AUTHENTICATION_BACKENDS = ['users.backends.RolePermissionBackend']
+ROLE_PERMISSIONS_TTL = 300  # seconds a process keeps its compiled role matrix at most
 TENANT_MODEL = "tenants.Tenant"
 TENANT_DOMAIN_MODEL = "tenants.Domain"
 
@@ -123,13 +127,37 @@ TENANT_IGNORE_URLS = [
     r'^/api/auth/me/',
 ]
 
+# Pre-migrated schemas kept ready for registration (manage.py fill_schema_pool)
+TENANT_SCHEMA_POOL_SIZE = config('TENANT_SCHEMA_POOL_SIZE', default=10, cast=int)
+# New schemas (pooled or not) are cloned from this migrated and seeded schema while
+# it is current, see tenants/template.py and manage.py rebuild_tenant_template
+TENANT_TEMPLATE_SCHEMA = 'tenant_template'
+
+# In-process host -> tenant cache used by tenants.middleware (see tenants/resolver.py)
+TENANT_RESOLVER_CACHE_SIZE = config('TENANT_RESOLVER_CACHE_SIZE', default=1024, cast=int)
+TENANT_RESOLVER_CACHE_TTL = config('TENANT_RESOLVER_CACHE_TTL', default=300, cast=int)  # seconds
+
+# Shared by every worker and management command: disabled tenants, permission and
+# role matrix versions, schedules (tenants/teardown.py, users/authentication.py,
+# users/backends.py). Redis when REDIS_URL is set, else a table of the database
+# created by manage.py createcachetable. Never a per-process cache.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}}
+# Seconds a process reuses a value read from the shared cache on the request path:
+# requests make no cache round trip (a query with the database cache) in between.
+# Other processes see a change made elsewhere within this delay.
+SHARED_CACHE_LOCAL_TTL = config('SHARED_CACHE_LOCAL_TTL', default=5, cast=int)
+
 # Domain settings
 DOMAIN_NAME = config('PRODUCTION_DOMAIN_NAME', default='localhost')
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.TenantJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -145,6 +173,9 @@ SIMPLE_JWT = {
     
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
+
+    # Re-issues access tokens with current tenant/role claims (see users/tokens.py)
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializer.TenantTokenRefreshSerializer',
 }
 
 
@@ -211,9 +242,10 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-RESEND_SMTP_PORT = 587
+RESEND_SMTP_PORT = config('RESEND_SMTP_PORT', default=587, cast=int)
 RESEND_SMTP_USERNAME = 'resend'
-RESEND_SMTP_HOST = 'smtp.resend.com'
+RESEND_SMTP_HOST = config('RESEND_SMTP_HOST', default='smtp.resend.com')
+RESEND_SMTP_USE_TLS = config('RESEND_SMTP_USE_TLS', default=True, cast=bool)
 
 LOGGING = {
     'version': 1,
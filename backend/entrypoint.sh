@@ -17,11 +17,24 @@ echo "PostgreSQL started"
 echo "Running migrate_schemas for the public schema..."
 python3 manage.py migrate_schemas --shared
 
+# The shared cache lives in the public schema unless REDIS_URL is set, creating it is idempotent
+echo "Creating the cache table (used when REDIS_URL is not set)..."
+python3 manage.py createcachetable
+
+# Then every tenant schema, in parallel and resumable if the deploy is interrupted
+echo "Running migrations for tenant schemas..."
+python3 manage.py migrate_tenant_schemas
+
+# New tenants are cloned from the template schema, rebuild it when migrations or seed data changed
+echo "Rebuilding the tenant template schema if needed..."
+python3 manage.py rebuild_tenant_template --if-stale
+
 # # Collect static files
 # echo "Collecting static files..."
 # python3 manage.py collectstatic --noinput
 
 # Start the Gunicorn server as a Python module
-# This uses the gunicorn installed from requirements.txt
+# This uses the gunicorn and uvicorn installed from requirements.txt, the ASGI
+# application also serves the live appointment stream (appointments/live.py)
 echo "Starting Gunicorn..."
-python3 -m gunicorn core.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
+python3 -m gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
\ No newline at end of file
@@ -5,5 +5,5 @@ class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
     
-    # def ready(self):
-    #     import inventory.signals
+    def ready(self):
+        import inventory.signals
@@ -0,0 +1,63 @@
+from django.db import connection
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from .models import Category, InventoryItem
+from .inventory_data import inventory_data
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def seed_inventory(tenant, schema_name=None):
+    """
+    Adds the default categories and items of inventory_data to a tenant, in one
+    round trip. Rows the tenant already has (same name, see the unique_together
+    of both models) are left alone, so it is safe to run any number of times.
+
+    `schema_name` defaults to the tenant's own schema (the template is seeded
+    before it gets its final name).
+    """
+    categories = [data['category'] for data in inventory_data]
+    items = [(data['category']['name'], item) for data in inventory_data for item in data.get('items', [])]
+    item_defaults = {name: InventoryItem._meta.get_field(name).get_default()
+                     for name in ('description', 'quantity', 'unit', 'minimum_quantity',
+                                  'cost_price', 'selling_price')}
+    now = timezone.now()
+
+    # Categories inserted by the first INSERT are not visible to a plain read of the
+    # table in the same statement, hence RETURNING unioned with the existing ones
+    sql = f"""
+        WITH new_categories AS (
+            INSERT INTO {Category._meta.db_table} (tenant_id, name, description, created_at, updated_at)
+            SELECT %(tenant)s, c.name, c.description, %(now)s, %(now)s
+            FROM unnest(%(category_names)s::text[], %(category_descriptions)s::text[]) AS c(name, description)
+            ON CONFLICT (tenant_id, name) DO NOTHING
+            RETURNING id, name
+        ), categories AS (
+            SELECT id, name FROM new_categories
+            UNION ALL
+            SELECT id, name FROM {Category._meta.db_table} WHERE tenant_id = %(tenant)s
+        )
+        INSERT INTO {InventoryItem._meta.db_table} (
+            tenant_id, category_id, name, description, quantity, unit, minimum_quantity,
+            cost_price, selling_price, created_at, updated_at
+        )
+        SELECT %(tenant)s, categories.id, i.name, %(description)s, %(quantity)s, %(unit)s,
+               %(minimum_quantity)s, %(cost_price)s, %(selling_price)s, %(now)s, %(now)s
+        FROM unnest(%(item_categories)s::text[], %(item_names)s::text[]) AS i(category, name)
+        JOIN categories ON categories.name = i.category
+        ON CONFLICT (tenant_id, name) DO NOTHING
+    """
+    with schema_context(schema_name or tenant.schema_name):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'tenant': tenant.pk,
+                'now': now,
+                'category_names': [category['name'] for category in categories],
+                'category_descriptions': [category.get('description', '') for category in categories],
+                'item_categories': [category for category, _ in items],
+                'item_names': [name for _, name in items],
+                **item_defaults,
+            })
+            logger.info(f"Seeded {cursor.rowcount} inventory items for tenant {tenant.schema_name}")
@@ -5,7 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from .models import Category, InventoryItem
 from .serializers import CategorySerializer, InventoryItemSerializer
 from django.db.models import Q
-from utils.pagination import CustomPagination
+from utils.pagination import CustomPagination, KeysetPagination
 from django.db import IntegrityError
 from rest_framework import serializers
 
@@ -40,7 +40,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
 class InventoryItemViewSet(viewsets.ModelViewSet):
     serializer_class = InventoryItemSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = CustomPagination  
+    pagination_class = KeysetPagination
+    keyset_ordering = ('name', 'id')
     lookup_field = 'pk'
 
     def get_queryset(self):
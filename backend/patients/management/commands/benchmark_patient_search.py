@@ -0,0 +1,115 @@
+import random
+import statistics
+import string
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django_tenants.utils import schema_context, get_public_schema_name
+from patients.models import Patient
+from patients.search import SEARCH_MODES, search_patients
+from tenants.models import Tenant
+from users.models import User
+
+BENCHMARK_MARKER = 'benchmark-search'
+SYLLABLES = ['ba', 'be', 'di', 'do', 'el', 'fa', 'ha', 'ib', 'ka', 'la', 'ma', 'mi', 'na', 'ni',
+             'ou', 'ra', 'ri', 'sa', 'se', 'ta', 'ti', 'ya', 'za', 'zi', 'mo', 'lu', 'an', 'or']
+
+
+def make_name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def misspell(rng, word):
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+class Command(BaseCommand):
+    help = 'Generate N patients in a tenant and measure ?q= search latency for every search mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', required=True, help='Tenant schema to generate the patients in')
+        parser.add_argument('--patients', type=int, default=100_000)
+        parser.add_argument('--iterations', type=int, default=50, help='Queries per mode and query kind')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the generated patients")
+
+    def handle(self, *args, **options):
+        with schema_context(get_public_schema_name()):
+            tenant = Tenant.objects.filter(schema_name=options['schema']).first()
+            dentist = User.objects.filter(tenant=tenant).first() if tenant else None
+        if dentist is None:
+            raise CommandError(f"{options['schema']} is not a tenant with at least one user")
+
+        rng = random.Random(42)
+        with schema_context(tenant.schema_name):
+            try:
+                patients = self.generate(rng, tenant, dentist, options['patients'])
+                for kind, make_query in self.query_kinds(rng).items():
+                    for mode in SEARCH_MODES:
+                        self.measure(kind, mode, [make_query(rng.choice(patients)) for _ in range(options['iterations'])])
+            finally:
+                if not options['keep']:
+                    Patient.objects.filter(insurance_id=BENCHMARK_MARKER).delete()
+
+    def generate(self, rng, tenant, dentist, count):
+        existing = Patient.objects.filter(insurance_id=BENCHMARK_MARKER).count()
+        if existing < count:
+            self.stdout.write(f'Generating {count - existing} patients...')
+            born = date(1940, 1, 1)
+            batch = []
+            for _ in range(count - existing):
+                first_name, last_name = make_name(rng), make_name(rng)
+                batch.append(Patient(
+                    first_name=first_name,
+                    last_name=last_name,
+                    date_of_birth=born + timedelta(days=rng.randrange(30000)),
+                    phone_number='+2126' + ''.join(rng.choices(string.digits, k=8)),
+                    email=f'{first_name}.{last_name}{rng.randrange(1000)}@example.com'.lower(),
+                    insurance_id=BENCHMARK_MARKER,
+                    dentist=dentist,
+                    tenant=tenant,
+                ))
+                if len(batch) == 5000:
+                    Patient.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+            Patient.objects.bulk_create(batch, ignore_conflicts=True)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Patient._meta.db_table}')
+        return list(Patient.objects.filter(insurance_id=BENCHMARK_MARKER)
+                    .values('first_name', 'last_name', 'phone_number', 'email')[:5000])
+
+    def query_kinds(self, rng):
+        return {
+            'last name': lambda p: p['last_name'],
+            'full name typo': lambda p: f"{p['first_name']} {misspell(rng, p['last_name'])}",
+            'name prefix': lambda p: p['last_name'][:4],
+            'local phone': lambda p: '0' + p['phone_number'][4:9],
+            'email': lambda p: p['email'].split('@')[0],
+        }
+
+    def measure(self, kind, mode, queries):
+        plan = self.explain(search_patients(Patient.objects.all(), queries[0], mode)[:20])
+        timings, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            results = list(search_patients(Patient.objects.all(), query, mode)[:20])
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += bool(results)
+        timings.sort()
+        self.stdout.write(
+            f"{kind:<15} {mode:<9} "
+            f"p50={statistics.median(timings):.1f}ms "
+            f"p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:.1f}ms "
+            f"found={hits}/{len(queries)} "
+            f"{'trigram index' if 'trgm' in plan else 'NO INDEX (seq scan)'}"
+        )
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
@@ -0,0 +1,37 @@
+# Generated by Django 5.1 on 2026-10-18 10:01
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0004_alter_patient_profile_picture'),
+    ]
+
+    operations = [
+        # Installed in public, which is on the search_path of every tenant schema. A plain
+        # TrigramExtension() would install it in the first tenant schema migrated.
+        migrations.RunSQL(
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='gin_trgm_ops'), name='patient_first_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='gin_trgm_ops'), name='patient_last_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), name='patient_email_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phone_number'], name='patient_phone_number_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -5,6 +5,8 @@ from django.db import models
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.utils.translation import gettext_lazy as _
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Upper
 from tenants.models import Tenant
 from datetime import date
 
@@ -84,6 +86,12 @@ class Patient(models.Model):
         indexes = [
             models.Index(fields=['last_name', 'first_name']),
             models.Index(fields=['date_of_birth']),
+            # Trigram indexes for the ?q= search (patients/search.py), on UPPER() since
+            # that is the expression icontains compares
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='patient_first_name_trgm'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='patient_last_name_trgm'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='patient_email_trgm'),
+            GinIndex(fields=['phone_number'], opclasses=['gin_trgm_ops'], name='patient_phone_number_trgm'),
         ]
         unique_together = [['first_name', 'last_name', 'date_of_birth', 'tenant']]
 
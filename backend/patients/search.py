@@ -0,0 +1,74 @@
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+
+# Columns covered by the GIN trigram indexes of Patient (see its Meta.indexes).
+# The name and email indexes are on UPPER(column), the expression icontains filters on.
+NAME_FIELDS = ('first_name', 'last_name')
+SEARCH_MODES = ('contains', 'similar')
+
+
+def normalize_phone(value):
+    """
+    Digits of a phone number without the leading zeros of a national prefix, so
+    "06 12-34" matches "+212612345678" and "0612345678" alike. Returns '' when
+    the value has fewer than 3 digits (too short for a trigram index lookup).
+    """
+    digits = re.sub(r'\D', '', value).lstrip('0')
+    return digits if len(digits) >= 3 else ''
+
+
+def _identifiers(query):
+    condition = Q(email__icontains=query)
+    phone = normalize_phone(query)
+    if phone:
+        condition |= Q(phone_number__contains=phone)
+    return condition
+
+
+def _contains(query):
+    condition = _identifiers(query)
+    for field in NAME_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def search_patients(queryset, query, mode='contains'):
+    """
+    Filters `queryset` on `query`, every filter is served by a trigram index.
+
+    contains: substring of first name, last name, email or phone number.
+    similar:  each word of the query must be a substring of, or close enough
+              (pg_trgm word similarity, typos included) to, the first or last
+              name; phone and email substrings match as well. Results are
+              ranked by similarity, best first.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if mode != 'similar':
+        return queryset.filter(_contains(query))
+
+    queryset = queryset.alias(**{f'{field}_upper': Upper(field) for field in NAME_FIELDS})
+    condition = Q()
+    ranks = []
+    for word in query.upper().split():
+        word_condition = Q()
+        for field in NAME_FIELDS:
+            word_condition |= Q(**{f'{field}_upper__contains': word})
+            word_condition |= Q(**{f'{field}_upper__trigram_word_similar': word})
+        condition &= word_condition
+        ranks.append(Greatest(*(TrigramWordSimilarity(word, f'{field}_upper') for field in NAME_FIELDS)))
+
+    rank = ranks[0]
+    for word_rank in ranks[1:]:
+        rank = rank + word_rank
+    # A phone number or email hit is an exact identifier, it ranks above any name
+    identifier = _identifiers(query)
+    rank = rank + Case(When(identifier, then=Value(1.0)), default=Value(0.0))
+    return (queryset
+            .filter(condition | identifier)
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', 'last_name', 'first_name'))
@@ -6,9 +6,11 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from .models import Patient
 from .serializers import PatientSerializer
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from utils.pagination import CustomPagination
+from users.authentication import TenantJWTAuthentication
+from utils.pagination import KeysetPagination
 from .utils import upload_patient_image
+from .search import SEARCH_MODES, search_patients
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 
@@ -16,10 +18,11 @@ class PatientViewSet(viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing patient information.
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [TenantJWTAuthentication]
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
+    keyset_ordering = ('last_name', 'first_name', 'id')
     parser_classes = (MultiPartParser, FormParser, JSONParser)
     lookup_field = 'pk'
     
@@ -37,18 +40,13 @@ class PatientViewSet(viewsets.ModelViewSet):
         if dentist_id:
             queryset = queryset.filter(dentist_id=dentist_id)
             
-        # Enhanced search functionality
+        # Search, ?mode=similar ranks by similarity and tolerates typos (see patients/search.py)
         search_query = self.request.query_params.get('q', None)
         if search_query:
-            queryset = queryset.filter(
-                first_name__icontains=search_query
-            ) | queryset.filter(
-                last_name__icontains=search_query
-            ) | queryset.filter(
-                phone_number__icontains=search_query
-            ) | queryset.filter(
-                email__icontains=search_query
-            )
+            mode = self.request.query_params.get('mode', 'contains')
+            if mode not in SEARCH_MODES:
+                raise ValidationError({'mode': f"Must be one of {', '.join(SEARCH_MODES)}"})
+            queryset = search_patients(queryset, search_query, mode)
             
         return queryset.select_related('dentist')
     
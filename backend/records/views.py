@@ -2,6 +2,7 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend # for advanced filtering
+from utils.pagination import KeysetPagination
 
 # Import models and serializers from this app
 from .models import ProcedureCategory, ProcedureType, Procedure
@@ -77,6 +78,8 @@ class ProcedureViewSet(TenantSpecificViewSet):
     serializer_class = ProcedureSerializer
     filter_backends = [DjangoFilterBackend] # Optional
     filterset_fields = ['patient', 'procedure_type', 'tooth', 'status', 'dentist', 'appointment'] # Optional
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-procedure_date', '-created_at', '-id') # id breaks ties between same-date procedures
     # search_fields = ['patient__first_name', 'patient__last_name', 'procedure_type__name', 'notes'] # Optional
 
     # Add filtering specific to date ranges etc. if needed via filtersets
\ No newline at end of file
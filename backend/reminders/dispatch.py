@@ -0,0 +1,173 @@
+import smtplib
+from collections import defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name, schema_context
+from tenants.models import Tenant
+from users.models import User
+from users.utils import get_resend_connection
+from .models import Reminder
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reminders claimed, rendered and sent per round
+BATCH_SIZE = 500
+# A claim older than this belongs to a worker that died
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+# One statement, committed on its own: a reminder is claimed by one worker only,
+# concurrent ones skip the rows already locked instead of waiting on them
+CLAIM_SQL = f"""
+    UPDATE {Reminder._meta.db_table} SET status = %s, claimed_at = %s, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM {Reminder._meta.db_table}
+        WHERE status = %s AND start_time > %s AND start_time <= %s
+          AND (claimed_at IS NULL OR claimed_at < %s)
+        ORDER BY start_time
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, schema_name, dentist_id, start_time, email, patient_name
+"""
+
+
+def get_lead_time():
+    """
+    How long before the appointment the reminder goes out.
+    """
+    return timedelta(hours=getattr(settings, 'REMINDER_LEAD_HOURS', 24))
+
+
+def get_max_attempts():
+    return getattr(settings, 'REMINDER_MAX_ATTEMPTS', 3)
+
+
+def claim_reminders(now, batch_size=BATCH_SIZE, claimed_before=None):
+    """
+    Marks up to `batch_size` pending reminders of appointments starting within
+    the lead time as being sent, soonest first, across every tenant. Reminders
+    last claimed after `claimed_before` (failed during this run) are left for
+    the next run. Returns their rows.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(CLAIM_SQL, [Reminder.Status.SENDING, now, Reminder.Status.PENDING,
+                                   now, now + get_lead_time(), claimed_before or now, batch_size])
+        return cursor.fetchall()
+
+
+def recover_reminders(now):
+    """
+    Puts back the reminders claimed by a worker that died before reporting, or
+    fails them after REMINDER_MAX_ATTEMPTS. Those may have gone out already: a
+    crash can send a reminder twice, never lose it. Reminders of appointments
+    that started meanwhile expire.
+    """
+    stale = Reminder.objects.filter(status=Reminder.Status.SENDING,
+                                    claimed_at__lt=now - CLAIM_TIMEOUT)
+    stale.filter(attempts__gte=get_max_attempts()).update(status=Reminder.Status.FAILED,
+                                                           error='Claimed but never reported')
+    stale.update(status=Reminder.Status.PENDING)
+    return Reminder.objects.filter(status=Reminder.Status.PENDING,
+                                   start_time__lte=now).update(status=Reminder.Status.EXPIRED)
+
+
+def _get_timezone(tz_name, schema_name):
+    try:
+        return ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.error(f"Unknown timezone {tz_name!r} for tenant {schema_name}")
+        return timezone.get_default_timezone()
+
+
+def render_reminders(rows):
+    """
+    {reminder id: EmailMessage}: the clinic's name and timezone and the
+    dentist's name are read for the whole batch in one query each.
+    """
+    tenants = {
+        schema_name: (name, _get_timezone(tz_name, schema_name))
+        for schema_name, name, tz_name in Tenant.objects
+        .filter(schema_name__in={row[1] for row in rows})
+        .values_list('schema_name', 'name', 'timezone')
+    }
+    dentists = {
+        pk: f"Dr. {first_name} {last_name}"
+        for pk, first_name, last_name in User.objects
+        .filter(id__in={row[2] for row in rows})
+        .values_list('id', 'first_name', 'last_name')
+    }
+    from_email = getattr(settings, 'REMINDER_FROM_EMAIL', 'noreply@crafitori.com')
+    messages = {}
+    for pk, schema_name, dentist_id, start_time, email, patient_name in rows:
+        clinic, tz = tenants.get(schema_name, ('your dental clinic', timezone.get_default_timezone()))
+        local_start = timezone.localtime(start_time, tz)
+        messages[pk] = EmailMessage(
+            subject=f"Appointment reminder - {clinic}",
+            body=(
+                f"Hello {patient_name},\n\n"
+                f"This is a reminder of your appointment at {clinic} "
+                f"on {local_start:%A %d %B %Y} at {local_start:%H:%M}"
+                f"{' with ' + dentists[dentist_id] if dentist_id in dentists else ''}.\n\n"
+                f"If you can't make it, please contact the clinic to reschedule.\n\n"
+                f"Best regards,\n{clinic}"
+            ),
+            from_email=from_email,
+            to=[email],
+        )
+    return messages
+
+
+def _report(sent, failed, now):
+    Reminder.objects.filter(pk__in=sent, status=Reminder.Status.SENDING).update(
+        status=Reminder.Status.SENT, sent_at=now, error='',
+    )
+    by_error = defaultdict(list)
+    for pk, error in failed.items():
+        by_error[error].append(pk)
+    for error, pks in by_error.items():
+        failing = Reminder.objects.filter(pk__in=pks, status=Reminder.Status.SENDING)
+        failing.filter(attempts__gte=get_max_attempts()).update(status=Reminder.Status.FAILED, error=error)
+        # Retried by the next round
+        failing.update(status=Reminder.Status.PENDING, error=error)
+
+
+def dispatch_reminders(batch_size=BATCH_SIZE, smtp=None):
+    """
+    Sends every due reminder of every tenant, `batch_size` at a time, over one
+    SMTP connection (`smtp`, get_resend_connection() by default) opened once
+    for the whole run. Returns (sent, failed).
+    """
+    total_sent = total_failed = 0
+    smtp = smtp or get_resend_connection()
+    started = timezone.now()
+    with schema_context(get_public_schema_name()):
+        recover_reminders(started)
+        with smtp:
+            while True:
+                rows = claim_reminders(timezone.now(), batch_size, claimed_before=started)
+                if not rows:
+                    break
+                sent, failed = [], {}
+                for pk, message in render_reminders(rows).items():
+                    try:
+                        smtp.send_messages([message])
+                        sent.append(pk)
+                    except Exception as e:
+                        logger.warning(f"Reminder {pk} not sent: {e}")
+                        failed[pk] = str(e) or e.__class__.__name__
+                        if isinstance(e, smtplib.SMTPServerDisconnected):
+                            smtp.close()
+                            smtp.open()
+                _report(sent, failed, timezone.now())
+                total_sent += len(sent)
+                total_failed += len(failed)
+                if len(rows) < batch_size:
+                    break
+    return total_sent, total_failed
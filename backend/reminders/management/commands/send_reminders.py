@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django_tenants.utils import schema_context, get_public_schema_name
+from appointments.models import Appointment
+from reminders.dispatch import BATCH_SIZE, dispatch_reminders
+from reminders.scheduling import sync_reminders
+from tenants.models import Tenant
+from tenants.template import get_template_schema_name
+
+# Appointments synced per query by --backfill
+BACKFILL_BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = ('Send the reminders of the appointments starting within REMINDER_LEAD_HOURS, for every '
+            'tenant at once. Several workers can run side by side, each reminder is sent by one of them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Reminders claimed per round')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and send the due reminders every INTERVAL seconds (background worker mode)')
+        parser.add_argument('--backfill', action='store_true',
+                            help='First schedule the reminders of the upcoming appointments booked before reminders existed')
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema to backfill, repeatable. Every active tenant when omitted')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill(options['schemas'])
+        while True:
+            sent, failed = dispatch_reminders(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'{sent} reminders sent, {failed} failed')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def backfill(self, schemas):
+        with schema_context(get_public_schema_name()):
+            tenants = (Tenant.objects.filter(is_active=True)
+                       .exclude(schema_name__in=[get_public_schema_name(), get_template_schema_name()]))
+            if schemas:
+                tenants = tenants.filter(schema_name__in=schemas)
+            schema_names = list(tenants.values_list('schema_name', flat=True))
+        for schema_name in schema_names:
+            with schema_context(schema_name):
+                ids = list(Appointment.objects.filter(start_time__gt=timezone.now())
+                           .values_list('id', flat=True))
+                for offset in range(0, len(ids), BACKFILL_BATCH):
+                    sync_reminders(ids[offset:offset + BACKFILL_BATCH])
+            self.stdout.write(f'{schema_name}: {len(ids)} upcoming appointments scheduled')
@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema_name', models.CharField(max_length=63)),
+                ('appointment_id', models.BigIntegerField()),
+                ('dentist_id', models.BigIntegerField()),
+                ('start_time', models.DateTimeField()),
+                ('email', models.EmailField(max_length=254)),
+                ('patient_name', models.CharField(max_length=201)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['start_time'], name='reminder_pending_idx'), models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='reminder_sending_idx')],
+                'unique_together': {('schema_name', 'appointment_id')},
+            },
+        ),
+    ]
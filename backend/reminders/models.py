@@ -0,0 +1,46 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Reminder(models.Model):
+    """
+    The reminder of one upcoming appointment of any tenant. Kept in the public
+    schema so one query finds the due reminders of every clinic (see
+    reminders/dispatch.py). Rows are written when the appointment commits
+    (see reminders/scheduling.py), with the patient's details of that time.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENDING = 'sending', 'Sending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+        CANCELLED = 'cancelled', 'Cancelled'
+        EXPIRED = 'expired', 'Expired'
+
+    # No foreign keys: appointments live in the tenant schemas, teardown_tenants
+    # deletes the rows by schema_name
+    schema_name = models.CharField(max_length=63)
+    appointment_id = models.BigIntegerField()
+    dentist_id = models.BigIntegerField()
+    start_time = models.DateTimeField()
+    email = models.EmailField()
+    patient_name = models.CharField(max_length=201)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['schema_name', 'appointment_id']
+        indexes = [
+            # Range scan of the claim query, only over what is left to send
+            models.Index(fields=['start_time'], name='reminder_pending_idx',
+                         condition=Q(status='pending')),
+            models.Index(fields=['claimed_at'], name='reminder_sending_idx',
+                         condition=Q(status='sending')),
+        ]
+
+    def __str__(self):
+        return f'{self.schema_name} appointment {self.appointment_id} ({self.status})'
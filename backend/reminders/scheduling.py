@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from appointments.models import Appointment
+from .models import Reminder
+
+# Appointments that get a reminder
+REMINDED_STATUSES = [Appointment.Status.SCHEDULED, Appointment.Status.CONFIRMED]
+
+# A reminder already sent (or being sent) for the same start time isn't sent again,
+# one for a moved appointment is
+UPSERT_SQL = f"""
+    INSERT INTO {Reminder._meta.db_table} AS reminder
+        (schema_name, appointment_id, dentist_id, start_time, email, patient_name,
+         status, attempts, error, created_at)
+    SELECT %s, rows.*, %s, 0, '', %s
+    FROM unnest(%s::bigint[], %s::bigint[], %s::timestamptz[], %s::text[], %s::text[]) AS rows
+    ON CONFLICT (schema_name, appointment_id) DO UPDATE SET
+        dentist_id = EXCLUDED.dentist_id,
+        email = EXCLUDED.email,
+        patient_name = EXCLUDED.patient_name,
+        start_time = EXCLUDED.start_time,
+        status = CASE WHEN reminder.start_time = EXCLUDED.start_time AND reminder.status = ANY(%s)
+                      THEN reminder.status ELSE EXCLUDED.status END,
+        attempts = CASE WHEN reminder.start_time = EXCLUDED.start_time THEN reminder.attempts ELSE 0 END
+"""
+
+
+def sync_reminders(appointment_ids):
+    """
+    Brings the reminders of the appointments `ids` of the current schema in line
+    with them: one query for the appointments and their patients, one upsert,
+    one UPDATE cancelling the rest (cancelled, past, deleted, patient without email).
+    """
+    appointment_ids = set(appointment_ids)
+    if not appointment_ids:
+        return
+    now = timezone.now()
+    rows = [
+        (pk, dentist_id, start_time, email, f"{first_name} {last_name}")
+        for pk, dentist_id, start_time, email, first_name, last_name in Appointment.objects
+        .filter(id__in=appointment_ids, status__in=REMINDED_STATUSES, start_time__gt=now)
+        .exclude(patient__email='')
+        .values_list('id', 'dentist_id', 'start_time', 'patient__email',
+                     'patient__first_name', 'patient__last_name')
+    ]
+    with transaction.atomic():
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.execute(UPSERT_SQL, [
+                    connection.schema_name, Reminder.Status.PENDING, now,
+                    *(list(column) for column in zip(*rows)),
+                    [Reminder.Status.SENDING, Reminder.Status.SENT, Reminder.Status.FAILED],
+                ])
+        Reminder.objects.filter(
+            schema_name=connection.schema_name, status=Reminder.Status.PENDING,
+            appointment_id__in=appointment_ids - {row[0] for row in rows},
+        ).update(status=Reminder.Status.CANCELLED)
+
+
+def sync_on_commit(appointment_ids):
+    """
+    sync_reminders() once the transaction commits, right away outside of one.
+    The appointments of a whole transaction are synced in one batch.
+    """
+    db = connections[DEFAULT_DB_ALIAS]
+    pending = getattr(db, 'reminders_pending', None)
+    if pending is None:
+        pending = db.reminders_pending = defaultdict(set)
+    schema_name = db.schema_name
+    pending[schema_name].update(appointment_ids)
+
+    def flush():
+        batch = pending.pop(schema_name, None)
+        if batch:
+            with schema_context(schema_name):
+                sync_reminders(batch)
+
+    transaction.on_commit(flush)
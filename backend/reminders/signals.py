@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from appointments.models import Appointment
+from patients.models import Patient
+from .scheduling import sync_on_commit
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    sync_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, **kwargs):
+    # The reminders carry the patient's name and email
+    if not created:
+        sync_on_commit(Appointment.objects.filter(patient=instance, start_time__gt=timezone.now())
+                       .values_list('id', flat=True))
@@ -39,5 +39,5 @@ else
 
     # Start the Gunicorn server in the foreground.
     echo "Starting Gunicorn server..."
-    python3 -m gunicorn core.wsgi:application --bind 0.0.0.0:8000 --timeout 120
+    python3 -m gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000 --timeout 120
 fi
\ No newline at end of file
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Tenant, Domain
+from .models import Tenant, Domain, PooledSchema, SchemaMigration
 
 admin.site.register(Tenant)
-admin.site.register(Domain)
\ No newline at end of file
+admin.site.register(Domain)
+admin.site.register(PooledSchema)
+admin.site.register(SchemaMigration)
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django_tenants.utils import schema_context, get_public_schema_name
+from tenants.models import SchemaMigration
+from tenants.schema_migrations import plan_schema_migrations, run_schema_migrations
+
+
+class Command(BaseCommand):
+    help = 'Migrate N generated empty schemas from scratch, serially and with a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schemas', type=int, default=8, help='Number of generated schemas')
+        parser.add_argument('--processes', type=int, action='append',
+                            help='Pool sizes to compare (repeatable, default: 1 and 4)')
+
+    def handle(self, *args, **options):
+        with schema_context(get_public_schema_name()):
+            for processes in options['processes'] or [1, 4]:
+                schema_names = [f'bench_migrate_{i}' for i in range(options['schemas'])]
+                try:
+                    with connection.cursor() as cursor:
+                        for name in schema_names:
+                            cursor.execute('DROP SCHEMA IF EXISTS "%s" CASCADE' % name)
+                            cursor.execute('CREATE SCHEMA "%s"' % name)
+                    SchemaMigration.objects.filter(schema_name__in=schema_names).delete()
+
+                    started = time.perf_counter()
+                    migrations = run_schema_migrations(plan_schema_migrations(schema_names), processes)
+                    elapsed = time.perf_counter() - started
+
+                    durations = sorted(m.duration_ms for m in migrations)
+                    failed = sum(m.status == m.Status.FAILED for m in migrations)
+                    self.stdout.write(self.style.SUCCESS(
+                        f"processes={processes} schemas={len(migrations)} failed={failed} "
+                        f"wall={elapsed:.1f}s "
+                        f"per-schema p50={durations[len(durations) // 2]}ms max={durations[-1]}ms"
+                    ))
+                finally:
+                    with connection.cursor() as cursor:
+                        for name in schema_names:
+                            cursor.execute('DROP SCHEMA IF EXISTS "%s" CASCADE' % name)
+                    SchemaMigration.objects.filter(schema_name__in=schema_names).delete()
@@ -0,0 +1,68 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django_tenants.utils import schema_context, get_public_schema_name
+from tenants.models import Tenant
+from tenants.template import get_template_schema_name
+from users.serializer import UserRegisterSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p95 registration latency: migrated schema, cloned template, schema pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10, help='Registrations per mode')
+        parser.add_argument('--mode', choices=['sync', 'template', 'pool', 'all'], default='all')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the tenants created by the benchmark")
+
+    def handle(self, *args, **options):
+        modes = ['sync', 'template', 'pool'] if options['mode'] == 'all' else [options['mode']]
+        created = []
+        try:
+            for mode in modes:
+                if mode == 'pool':
+                    self.stdout.write(f"Filling the pool with {options['count']} schemas (not timed)...")
+                    from django.core.management import call_command
+                    call_command('fill_schema_pool', size=options['count'], stdout=self.stdout._out)
+                timings = []
+                # sync migrates every new schema, template clones it, pool claims a ready one
+                template = None if mode == 'sync' else get_template_schema_name()
+                with override_settings(TENANT_SCHEMA_POOL_ENABLED=(mode == 'pool'), TENANT_TEMPLATE_SCHEMA=template):
+                    for _ in range(options['count']):
+                        started = time.perf_counter()
+                        created.append(self.register())
+                        timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f"{mode:<8} n={len(timings)} "
+                    f"p50={timings[len(timings) // 2]:.0f}ms "
+                    f"p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:.0f}ms"
+                ))
+        finally:
+            if not options['keep']:
+                with schema_context(get_public_schema_name()):
+                    tenants = list(Tenant.objects.filter(schema_name__in=created))
+                for tenant in tenants:
+                    # Delete inside the tenant schema so the cascade reaches its tables, then drop it
+                    with schema_context(tenant.schema_name):
+                        tenant.delete()
+                    with connection.cursor() as cursor:
+                        cursor.execute('DROP SCHEMA IF EXISTS "%s" CASCADE' % tenant.schema_name)
+
+    def register(self):
+        suffix = uuid.uuid4().hex[:8]
+        with schema_context(get_public_schema_name()):
+            serializer = UserRegisterSerializer(data={
+                'email': f'bench-{suffix}@example.com',
+                'first_name': 'Bench',
+                'last_name': 'Mark',
+                'password': 'benchmark-password',
+                'password2': 'benchmark-password',
+                'clinic_name': f'Bench Clinic {suffix}',
+            })
+            serializer.is_valid(raise_exception=True)
+            user, _ = serializer.save()
+            return user.tenant.schema_name
@@ -0,0 +1,74 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from tenants.middleware import CustomTenantMiddleware
+
+
+class Command(BaseCommand):
+    help = 'Measure latency and queries per request of CustomTenantMiddleware (authorize-first vs view-first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', required=True, help='An existing tenant domain, e.g. clinic.localhost')
+        parser.add_argument('--path', default='/api/appointments/')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--view-ms', type=float, default=20.0,
+                            help='Simulated cost of the downstream stack + view, in milliseconds')
+        parser.add_argument('--email', help='Also benchmark an accepted request with a token of this user')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        view_calls = {'count': 0}
+
+        def view(request):
+            view_calls['count'] += 1
+            time.sleep(options['view_ms'] / 1000)
+            return HttpResponse()
+
+        middleware = CustomTenantMiddleware(view)
+
+        def view_first(request):
+            # The previous ordering: the whole stack ran, then the checks
+            view(request)
+            return middleware(request)
+
+        scenarios = {
+            'no token': {},
+            'invalid token': {'HTTP_AUTHORIZATION': 'Bearer not-a-jwt'},
+        }
+        if options['email']:
+            from users.models import User
+            access = User.objects.get(email=options['email']).tokens()['access']
+            scenarios['valid token'] = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+
+        for name, headers in scenarios.items():
+            handlers = [('view-first', view_first), ('authorize-first', middleware)]
+            if name == 'valid token':
+                # Accepted requests run the view either way
+                handlers = handlers[1:]
+            for label, handler in handlers:
+                view_calls['count'] = 0
+                handler(factory.get(options['path'], HTTP_HOST=options['host'], **headers))  # warm the resolver
+                view_calls['count'] = 0
+
+                timings = []
+                status = None
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(options['iterations']):
+                        request = factory.get(options['path'], HTTP_HOST=options['host'], **headers)
+                        started = time.perf_counter()
+                        status = handler(request).status_code
+                        timings.append((time.perf_counter() - started) * 1000)
+
+                timings.sort()
+                self.stdout.write(
+                    f"{name:<14} {label:<16} status={status} "
+                    f"mean={statistics.mean(timings):.2f}ms "
+                    f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms "
+                    f"view_calls={view_calls['count']} "
+                    f"queries/request={len(queries) / options['iterations']:.1f}"
+                )
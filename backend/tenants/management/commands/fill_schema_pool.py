@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context, get_public_schema_name
+from tenants.models import PooledSchema
+from tenants.provisioning import get_migration_state, migrate_pool_schema, provision_pool_schema
+
+
+class Command(BaseCommand):
+    help = 'Top up the pool of pre-migrated tenant schemas used by registration'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=getattr(settings, 'TENANT_SCHEMA_POOL_SIZE', 10),
+                            help='Number of ready schemas to keep in the pool')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and top up every INTERVAL seconds (background worker mode)')
+
+    def handle(self, *args, **options):
+        while True:
+            with schema_context(get_public_schema_name()):
+                self.fill(options['size'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def fill(self, size):
+        # Schemas pooled before the last deploy are migrated first, they are cheaper than new ones
+        for pooled in PooledSchema.objects.exclude(migration_state=get_migration_state()):
+            migrate_pool_schema(pooled)
+            self.stdout.write(f'Migrated pooled schema {pooled.schema_name}')
+
+        ready = PooledSchema.objects.count()
+        for _ in range(max(size - ready, 0)):
+            pooled = provision_pool_schema()
+            self.stdout.write(f'Added {pooled.schema_name} to the pool')
+
+        self.stdout.write(self.style.SUCCESS(f'Schema pool has {PooledSchema.objects.count()} schemas (target {size})'))
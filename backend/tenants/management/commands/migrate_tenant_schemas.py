@@ -0,0 +1,44 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context, get_public_schema_name
+from tenants.models import Tenant
+from tenants.schema_migrations import plan_schema_migrations, run_schema_migrations
+
+
+class Command(BaseCommand):
+    help = ('Migrate every tenant schema in parallel, largest first. Progress is recorded in '
+            'SchemaMigration, rerunning after a crash only migrates the schemas not done yet')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=min(os.cpu_count() or 1, 4),
+                            help='Number of schemas migrated at the same time')
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Only migrate this schema (repeatable)')
+        parser.add_argument('--skip-failed', action='store_true',
+                            help="Don't retry schemas that failed in a previous run")
+
+    def handle(self, *args, **options):
+        with schema_context(get_public_schema_name()):
+            schema_names = options['schemas'] or list(
+                Tenant.objects.exclude(schema_name=get_public_schema_name()).values_list('schema_name', flat=True))
+            planned = plan_schema_migrations(schema_names, retry_failed=not options['skip_failed'])
+            self.stdout.write(f"{len(schema_names) - len(planned)} schemas already migrated, "
+                              f"migrating {len(planned)} with {options['processes']} processes")
+
+            done = {'count': 0}
+
+            def report(migration):
+                done['count'] += 1
+                style = self.style.SUCCESS if migration.status == migration.Status.DONE else self.style.ERROR
+                self.stdout.write(style(f"[{done['count']}/{len(planned)}] {migration.schema_name} "
+                                        f"{migration.status} in {migration.duration_ms}ms"))
+
+            migrations = run_schema_migrations(planned, options['processes'], on_result=report)
+
+        failed = [m for m in migrations if m.status == m.Status.FAILED]
+        if failed:
+            self.stderr.write(f"{len(failed)} schemas failed, see SchemaMigration.error. "
+                              f"Rerun the command to retry them.")
+            sys.exit(1)
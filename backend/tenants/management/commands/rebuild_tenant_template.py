@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import schema_context, get_public_schema_name
+from tenants.template import check_template, get_template_schema_name, rebuild_template
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the template schema new tenants are cloned from (run after tenant migrations)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report template drift, exit with status 1 if there is any')
+        parser.add_argument('--if-stale', action='store_true',
+                            help='Only rebuild when the template has drifted (deploy scripts)')
+
+    def handle(self, *args, **options):
+        schema_name = get_template_schema_name()
+        if not schema_name:
+            self.stdout.write('TENANT_TEMPLATE_SCHEMA is not set, nothing to do')
+            return
+
+        with schema_context(get_public_schema_name()):
+            problems = check_template()
+            for problem in problems:
+                self.stdout.write(self.style.WARNING(problem))
+
+            if options['check']:
+                if problems:
+                    sys.exit(1)
+                self.stdout.write(self.style.SUCCESS(f'Template schema {schema_name} is up to date'))
+                return
+            if options['if_stale'] and not problems:
+                self.stdout.write(f'Template schema {schema_name} is up to date')
+                return
+
+            rebuild_template()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt template schema {schema_name}'))
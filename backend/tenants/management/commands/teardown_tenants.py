@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django_tenants.utils import schema_context, get_public_schema_name
+from tenants.models import Tenant
+from tenants.teardown import disable_tenant, get_teardown_delay, teardown_tenant
+from tenants.template import get_template_schema_name
+
+
+class Command(BaseCommand):
+    help = 'Disable the given tenants right away and delete every tenant queued for deletion, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_names', nargs='*', help='Tenants to disable and queue for deletion')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users deleted per transaction')
+        parser.add_argument('--queue-only', action='store_true',
+                            help='Only disable and queue the given tenants, leave the deletion to the worker')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and process the queue every INTERVAL seconds (background worker mode)')
+
+    def handle(self, *args, **options):
+        with schema_context(get_public_schema_name()):
+            for schema_name in options['schema_names']:
+                if schema_name in (get_public_schema_name(), get_template_schema_name()):
+                    raise CommandError(f'Refusing to delete {schema_name}')
+                tenant = Tenant.objects.filter(schema_name=schema_name).first()
+                if tenant is None:
+                    raise CommandError(f'No tenant with schema {schema_name}')
+                disable_tenant(tenant, delete=True)
+                self.stdout.write(f'Disabled {schema_name} and queued it for deletion')
+            if options['queue_only']:
+                return
+
+            while True:
+                # Tenants disabled more recently may still be served by some worker
+                due = Tenant.objects.filter(deletion_requested_at__lte=timezone.now() - get_teardown_delay())
+                for tenant in due.order_by('deletion_requested_at'):
+                    if teardown_tenant(tenant, batch_size=options['batch_size'], progress=self.stdout.write):
+                        self.stdout.write(self.style.SUCCESS(f'Deleted tenant {tenant.schema_name}'))
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
@@ -1,189 +1,186 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseNotFound
+from django.core.exceptions import DisallowedHost
 from django_tenants.middleware import TenantMainMiddleware
 from django.contrib.auth.models import AnonymousUser
-from django_tenants.utils import get_tenant_domain_model, get_public_schema_name
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from django.contrib.auth.middleware import get_user
+from django_tenants.utils import get_public_schema_name
+from users.authentication import TenantJWTAuthentication
 
 from django.apps import apps
 from django.db import connections
 from django.conf import settings
+from django.utils import timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from .resolver import tenant_resolver
+from .teardown import is_tenant_disabled
 
+import copy
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
-class CustomTenantMiddleware(TenantMainMiddleware):  
+class CustomTenantMiddleware(TenantMainMiddleware):
+    """
+    The only tenant middleware in the stack: resolves host -> tenant once (cached),
+    sets the connection schema once, publishes it as request.tenant and authorizes
+    the request before the view runs.
+
+    Only the helpers of TenantMainMiddleware are reused, its process_request is never called.
+    """
     TENANT_CONNECTION = 'default'
+    # __call__ is synchronous: under ASGI, Django runs it in a thread (see core/asgi.py)
+    async_capable = False
 
-    def __call__(self, request):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # URLs served from the public schema whatever the host (register, refresh, ...)
+        self.ignored_urls = [re.compile(url) for url in getattr(settings, 'TENANT_IGNORE_URLS', [])]
 
-        exempt_paths = [
-            '/api/auth/register/',
-            '/api/auth/verify-email/',
-            '/api/auth/password-reset/',
-            '/api/auth/password-reset-confirm/',
-            '/api/auth/set-new-password/',
-            '/api/auth/logout/',
-            '/api/auth/refresh/',
-            '/api/auth/me',
-        ]
-        
+    def __call__(self, request):
         logger.info(f"Processing request for path: {request.path}")
-        # Skip tenant logic for exempt paths (no domain/schema checks)
-        if any(request.path.startswith(path) for path in exempt_paths):
+        connection = connections[self.TENANT_CONNECTION]
+
+        # Skip tenant logic for ignored paths (no domain/schema checks)
+        if self._is_ignored_url(request):
             logger.debug("Setting public schema for auth URL")
-            connection = connections['default']
             connection.set_schema_to_public()
-            Tenant = apps.get_model('tenants', 'Tenant')
-            try:
-                request.tenant = Tenant.objects.get(schema_name=get_public_schema_name())
-            except Tenant.DoesNotExist:
-                logger.error("Public tenant does not exist!")
-                # Create public tenant on the fly if it doesn't exist
-                public_tenant = Tenant.objects.create(
-                    schema_name=get_public_schema_name(),
-                    name='Public'
-                )
-                Domain = apps.get_model('tenants', 'Domain')
-                domain_name = settings.DOMAIN_NAME
-                Domain.objects.create(
-                    domain=domain_name,
-                    tenant=public_tenant,
-                    is_primary=True
-                )
-                request.tenant = public_tenant
-            
+            request.tenant = self._get_public_tenant()
+            self.setup_url_routing(request)
             return self.get_response(request)
 
-        
-        print("Path is not exempt, proceeding with normal tenant resolution")
-        response = super().__call__(request)
-
-        current_domain = request.get_host().split(':')[0].lower()
+        try:
+            current_domain = self.hostname_from_request(request).lower()
+        except DisallowedHost:
+            return HttpResponseNotFound()
         logger.info(f"Incoming request domain: {current_domain}")
-        
-        Domain = get_tenant_domain_model()
-        domains = Domain.objects.all().values('domain', 'tenant__schema_name')
-        logger.info(f"All domains: {list(domains)}")
 
+        current_tenant = tenant_resolver.get_tenant(current_domain)
+        if current_tenant is None:
+            # Same fallbacks as TenantMainMiddleware: DEFAULT_NOT_FOUND_TENANT_VIEW,
+            # then SHOW_PUBLIC_IF_NO_TENANT_FOUND, else 404
+            try:
+                response = self.no_tenant_found(request, current_domain)
+            except self.TENANT_NOT_FOUND_EXCEPTION:
+                return JsonResponse({"error": f"No domain found for: {current_domain}"}, status=404)
+            if response is not None:
+                return response
+            connection.set_schema_to_public()
+            current_tenant = request.tenant = self._get_public_tenant()
+        else:
+            logger.info(f"Found domain: {current_domain}, tenant: {current_tenant.schema_name}")
+            if is_tenant_disabled(current_tenant):
+                return JsonResponse({"error": "This clinic has been disabled"}, status=403)
+            # On a copy: the resolver shares the cached tenant between requests and threads
+            current_tenant = copy.copy(current_tenant)
+            current_tenant.domain_url = current_domain
+            connection.set_tenant(current_tenant)
+            request.tenant = current_tenant
+            self.setup_url_routing(request)
+
+        # Everything above and below runs before the view: a request that is going to be
+        # rejected must not pay for (or have side effects from) the downstream stack
+        denied = self._authorize(request, current_tenant, current_domain)
+        if denied is not None:
+            return denied
+
+        timezone.activate(self._get_timezone(current_tenant))
         try:
-            domain = Domain.objects.get(domain=current_domain)
-            logger.info(f"Found domain: {domain.domain}, tenant: {domain.tenant.schema_name}")
-            
-            # Set the tenant manually
-            connection = connections[self.TENANT_CONNECTION]
-            connection.set_tenant(domain.tenant)
-            request.tenant = domain.tenant
-            
-        except Domain.DoesNotExist:
-            return JsonResponse({"error": f"No domain found for: {current_domain}"}, status=404)  
-                      
-        current_tenant = domain.tenant
-        tenant_domain = Domain.objects.get(tenant=current_tenant).domain
-        
-        print("==== Debug Information ====")
-        print(f"Current tenant from request: {current_tenant}")
-        logger.info(f"Curent domain: {current_domain}")
-        print(f"Tenant domain: {tenant_domain}")
-        
-        
-        # print("==== Debug Permission Information ====")
-        # print(f"User: {request.user}")
-        # print(f"User permissions: {request.user.get_all_permissions()}")  # This will show all permissions
-        # print(f"Has view_user permission: {request.user.has_perm('users.view_user')}")
-        
-        print("==== User Specific Debug Infomation ====")
-        # print(f'user: {request.user.email}')
-        # print(f'tenant: {request.user.tenant.name}') # This line is causing a crash for users created 
-        # print(f'role: {request.user.role}')
-        
-
-        
-        # If we're dealing with public tenant, just return
-        # if current_tenant.schema_name == 'public':
-        #     return response
-        
+            return self.get_response(request)
+        finally:
+            timezone.deactivate()
 
+    def _get_timezone(self, tenant):
+        try:
+            return ZoneInfo(tenant.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.error(f"Unknown timezone {tenant.timezone!r} for tenant {tenant.schema_name}")
+            return timezone.get_default_timezone()
+
+    def _get_public_tenant(self):
+        public_tenant = tenant_resolver.get_tenant_by_schema(get_public_schema_name())
+        if public_tenant is None:
+            logger.error("Public tenant does not exist!")
+            # Create public tenant on the fly if it doesn't exist
+            Tenant = apps.get_model('tenants', 'Tenant')
+            public_tenant = Tenant.objects.create(
+                schema_name=get_public_schema_name(),
+                name='Public'
+            )
+            Domain = apps.get_model('tenants', 'Domain')
+            domain_name = settings.DOMAIN_NAME
+            Domain.objects.create(
+                domain=domain_name,
+                tenant=public_tenant,
+                is_primary=True
+            )
+        return public_tenant
+
+    def _is_ignored_url(self, request):
+        return any(url.match(request.path) for url in self.ignored_urls)
+
+    def _authenticate(self, request):
+        """
+        Returns the user of the bearer token, AnonymousUser when no token was sent.
+        Raises if the token is invalid.
+
+        The token is decoded once: TenantJWTAuthentication keeps the result on the
+        request and DRF's authentication reuses it.
+        """
+        result = TenantJWTAuthentication().authenticate(request)
+        if result is None:
+            return AnonymousUser()
+        return result[0]
+
+    def _authorize(self, request, current_tenant, current_domain):
+        """
+        Pre-dispatch checks: token, anonymous URL list and tenant/domain match.
+        Returns the rejection response, or None when the request may reach the view.
+        """
         try:
             # Ensure user is authenticated if token is present
-            if 'Authorization' in request.headers and isinstance(request.user, AnonymousUser):
-                try:
-                    jwt_auth = JWTAuthentication()
-                    validated_token = jwt_auth.get_validated_token(
-                        request.headers['Authorization'].split(' ')[1]
-                    )
-                    # Get user with select_related to ensure tenant is loaded
-                    user = jwt_auth.get_user(validated_token)
-                    request.user = user
-                    print(user)
-                    print("User has been assigned to the request")
-                    print(f"Request user after manual assignment: {request.user}")
-                except Exception as e:
-                    print(f"Token validation error: {str(e)}")
-                    return JsonResponse({"error": "Invalid authentication token"}, status=401)
-
-            logger.info(f"User: {request.user}")
-            logger.info(f"User permissions: {request.user.get_all_permissions()}")  # This will show all permissions
-            logger.info(f"Has view_user permission: {request.user.has_perm('users.view_user')}")
-            
+            try:
+                user = self._authenticate(request)
+            except Exception as e:
+                logger.info(f"Token validation error: {e}")
+                return JsonResponse({"error": "Invalid authentication token"}, status=401)
+
+            logger.info(f"User: {user.pk}, role: {getattr(user, 'role', None)}")
+
             # Handle authentication check, this is neccessa
-            if isinstance(request.user, AnonymousUser):
+            if isinstance(user, AnonymousUser):
                 if not self._is_allowed_anonymous_url(request):
                     return JsonResponse({"error": "Authentication required, Login and try again"}, status=401)
-                return response
-            
-            # if not request.user.tenant:
-            #     return JsonResponse({"you fucked boy": "this user actually have no tenant attached to it. take a fucking look at CreateTenantUserView"})
-            # elif request.user.tenant:
-            #     return JsonResponse({'user': request.user.email,
-            #                          'tenant': request.user.tenant.name,
-            #                          'role': request.user.role})
-
-            
-            user_domain = Domain.objects.get(tenant=request.user.tenant)
-            
+                return None
+
+            # Tenant and domain come from the token claims, no user/domain lookup needed
+            user_domain = user.tenant_domain
+            if user_domain is None:
+                logger.error(f"Domain not found for tenant: {user.tenant_schema}")
+                return JsonResponse({"error": "Domain configuration error"}, status=403)
+
             # User validation
-            if request.user.tenant != current_tenant:
+            if user.tenant_schema != current_tenant.schema_name:
                 return JsonResponse({"error": "Invalid tenant access, Please use your assigned domain",
                                     "current": current_domain,
-                                    "allowed": user_domain.domain.lower()}, status=403)
+                                    "allowed": user_domain}, status=403)
             # Domain validation
-            try:
-                if current_domain != user_domain.domain.lower():
-                    return JsonResponse({
-                        "error": "Invalid domain access",
-                        "current": current_domain,
-                        "allowed": user_domain.domain.lower()
-                    }, status=403)
-                
-            except Domain.DoesNotExist:
-                print(f"Domain not found for tenant: {request.user.tenant}")
-                return JsonResponse({"error": "Domain configuration error"}, status=403)
-            
-            
+            if current_domain != user_domain:
+                return JsonResponse({
+                    "error": "Invalid domain access",
+                    "current": current_domain,
+                    "allowed": user_domain
+                }, status=403)
+
             # Verify Payment, make sure this check is only ran on the first Register, not on employees
             # if not request.user.is_paid:
             #     return JsonResponse({"error": "Payment required"}, status=402)
-            
-            return response
-            
+
+            return None
+
         except Exception as e:
-            print(f"Middleware error: {str(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Middleware error")
             return JsonResponse({"error": f"Access denied: {str(e)}"}, status=403)
-    
-    def _is_public_url(self, request):
-        public_urls = [
-            '/api/auth/',
-            '/admin/',
-            '/api/token/',
-            '/api/token/refresh/'
-            'api/auth/password-reset-confirm/',
-        ]
-        return any(request.path.startswith(url) for url in public_urls)
-    
+
     def _is_allowed_anonymous_url(self, request):
         anonymous_urls = [
             '/api/auth/login/',
@@ -194,6 +191,7 @@ class CustomTenantMiddleware(TenantMainMiddleware):
             '/api/token/',
             '/api/token/refresh/',
             '/api/auth/set-new-password/', 
-            '/api/auth/password-reset-confirm/'
+            '/api/auth/password-reset-confirm/',
+            '/api/appointments/ics/',  # Calendar feeds, authorized by their token
         ]
         return any(request.path.startswith(url) for url in anonymous_urls)
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Entry points of the migrate_tenant_schemas worker processes. Workers are spawned,
+so this module is imported before Django is set up: keep model imports out of it.
+"""
+import io
+import time
+import traceback
+
+from django.db import connections
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def migrate_schema(schema_name):
+    """
+    Runs in a worker process. Returns (schema_name, ok, duration_ms, error).
+    """
+    from django.core.management import call_command
+
+    started = time.perf_counter()
+    try:
+        call_command('migrate_schemas', tenant=True, schema_name=schema_name, interactive=False,
+                     verbosity=0, stdout=io.StringIO())
+        error = ''
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        connections.close_all()
+    return schema_name, not error, int((time.perf_counter() - started) * 1000), error
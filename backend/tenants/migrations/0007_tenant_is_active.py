@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0006_schemamigration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='deletion_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+    ]
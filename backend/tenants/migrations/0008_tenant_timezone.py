@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0007_tenant_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='timezone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+    ]
@@ -13,6 +13,13 @@ class Tenant(TenantMixin):
     paid_until = models.DateField(null=True)  
     on_trial = models.BooleanField(default=True)
     is_verified = models.BooleanField(default=False)  
+    # A disabled tenant is rejected by the middleware, deletion_requested_at queues it
+    # for manage.py teardown_tenants (see tenants/teardown.py)
+    is_active = models.BooleanField(default=True)
+    deletion_requested_at = models.DateTimeField(null=True, blank=True)
+    # IANA name, e.g. 'Africa/Casablanca'. Activated by the middleware: calendar days
+    # and working hours of the clinic are in this timezone
+    timezone = models.CharField(max_length=64, default='UTC')
     
     auto_create_schema = True  # Automatically create schema on save
     
@@ -21,3 +28,48 @@ class Domain(DomainMixin):
     pass  # Stores domain/subdomain info
 
 
+class PooledSchema(models.Model):
+    """
+    A tenant schema created and migrated ahead of time, not assigned to any tenant yet.
+    Registration claims one instead of migrating a new schema (see tenants/provisioning.py).
+    """
+    schema_name = models.CharField(max_length=63, unique=True)
+    # Leaf migrations of TENANT_APPS the schema was migrated to, only current ones get claimed
+    migration_state = models.CharField(max_length=64, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return self.schema_name
+
+
+class SchemaMigration(models.Model):
+    """
+    Outcome of migrating one tenant schema to one migration state, written by
+    manage.py migrate_tenant_schemas. A rerun skips the schemas already done.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    schema_name = models.CharField(max_length=63)
+    # Same fingerprint as PooledSchema.migration_state
+    migration_state = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    size_bytes = models.BigIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ['schema_name', 'migration_state']
+        ordering = ['-size_bytes']
+
+    def __str__(self):
+        return f'{self.schema_name} ({self.status})'
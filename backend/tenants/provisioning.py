@@ -0,0 +1,110 @@
+import hashlib
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django_tenants.models import TenantMixin
+from django_tenants.signals import post_schema_sync
+from django_tenants.utils import schema_exists
+from .models import Tenant, PooledSchema
+from .template import assign_schema, check_template, clone_template, get_tenant_migrations
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def generate_schema_name():
+    return f"tenant_{uuid.uuid4().hex}"  # e.g., "tenant_1a2b3c4d5e..."
+
+
+@lru_cache(maxsize=1)
+def get_migration_state():
+    """
+    Fingerprint of the TENANT_APPS migrations on disk. A pooled schema migrated
+    to another state is not claimed until fill_schema_pool migrates it.
+    """
+    migrations = sorted(f"{app}.{name}" for app, name in get_tenant_migrations())
+    return hashlib.sha256("\n".join(migrations).encode()).hexdigest()
+
+
+def create_schema(schema_name):
+    """
+    Creates a ready to use tenant schema: cloned from the template when it is
+    current, migrated (and left unseeded) otherwise.
+    """
+    problems = check_template()
+    if not problems:
+        clone_template(schema_name)
+        return
+    logger.warning(f"Not cloning the tenant template ({'; '.join(problems)}), migrating {schema_name}")
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE SCHEMA "%s"' % schema_name)
+    call_command('migrate_schemas', tenant=True, schema_name=schema_name, interactive=False, verbosity=0)
+
+
+def provision_pool_schema():
+    """
+    Creates an unassigned schema and adds it to the pool. Meant to run out of
+    band (fill_schema_pool).
+    """
+    schema_name = generate_schema_name()
+    create_schema(schema_name)
+    return PooledSchema.objects.create(schema_name=schema_name, migration_state=get_migration_state())
+
+
+def migrate_pool_schema(pooled):
+    """
+    Brings a pooled schema created before the latest deploy up to date.
+    """
+    call_command('migrate_schemas', tenant=True, schema_name=pooled.schema_name, interactive=False, verbosity=0)
+    pooled.migration_state = get_migration_state()
+    pooled.save(update_fields=['migration_state'])
+
+
+def claim_pooled_schema():
+    """
+    Takes the oldest up-to-date pooled schema, or returns None if the pool is empty.
+    Must run inside a transaction: if it rolls back the schema goes back to the pool.
+    """
+    pooled = (PooledSchema.objects.select_for_update(skip_locked=True)
+              .filter(migration_state=get_migration_state())
+              .order_by('created_at')
+              .first())
+    if pooled is None:
+        return None
+    if not schema_exists(pooled.schema_name):
+        logger.error(f"Pooled schema {pooled.schema_name} does not exist, dropping it from the pool")
+        pooled.delete()
+        return claim_pooled_schema()
+    pooled.delete()
+    return pooled.schema_name
+
+
+def create_tenant(**fields):
+    """
+    Creates a tenant, on a pooled schema when one is available.
+
+    The schema is a pooled or freshly created one, rows it was cloned with are
+    re-pointed at the new tenant before post_schema_sync (inventory seeding) is sent.
+    """
+    with transaction.atomic():
+        schema_name = None
+        if getattr(settings, 'TENANT_SCHEMA_POOL_ENABLED', True):
+            schema_name = claim_pooled_schema()
+        if schema_name is None:
+            logger.warning("Tenant schema pool is empty, creating the schema synchronously")
+            schema_name = generate_schema_name()
+            create_schema(schema_name)
+        else:
+            logger.info(f"Claimed pooled schema {schema_name}")
+        # The schema exists already, saving without auto_create_schema keeps django-tenants
+        # from sending post_schema_sync before the cloned rows belong to the tenant
+        tenant = Tenant(schema_name=schema_name, **fields)
+        tenant.auto_create_schema = False
+        tenant.save()
+        assign_schema(schema_name, tenant)
+        post_schema_sync.send(sender=TenantMixin, tenant=tenant.serializable_fields())
+        return tenant
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django_tenants.utils import get_tenant_domain_model, get_tenant_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache where every entry expires after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TenantResolver:
+    """
+    In-process cache for the public-schema lookups the tenant middleware does
+    on every request: host -> tenant, tenant -> primary domain and the public
+    tenant itself.
+
+    Entries are dropped on any Tenant/Domain save or delete (see tenants/signals.py).
+    Other worker processes only see the change once the TTL runs out.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._cache = LRUCache(
+            maxsize=maxsize or getattr(settings, 'TENANT_RESOLVER_CACHE_SIZE', 1024),
+            ttl=ttl or getattr(settings, 'TENANT_RESOLVER_CACHE_TTL', 300),
+        )
+
+    def _get_or_load(self, key, loader):
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self._cache.set(key, value)
+        return value
+
+    def get_tenant(self, hostname):
+        """
+        Returns the tenant owning `hostname`, or None if no domain matches.
+        Unknown hosts are cached as well so garbage Host headers can't hammer the DB.
+        """
+        def load():
+            Domain = get_tenant_domain_model()
+            domain = Domain.objects.select_related('tenant').filter(domain=hostname).first()
+            return domain.tenant if domain else None
+
+        return self._get_or_load(('host', hostname), load)
+
+    def get_primary_domain(self, tenant_id):
+        """
+        Returns the (lowercased) primary domain name of a tenant, or None.
+        """
+        def load():
+            Domain = get_tenant_domain_model()
+            domain = (Domain.objects.filter(tenant_id=tenant_id)
+                      .order_by('-is_primary', 'id')
+                      .values_list('domain', flat=True)
+                      .first())
+            return domain.lower() if domain else None
+
+        return self._get_or_load(('primary_domain', tenant_id), load)
+
+    def get_tenant_by_schema(self, schema_name):
+        """
+        Returns the tenant for a schema name (e.g. the public tenant), or None.
+        """
+        def load():
+            return get_tenant_model().objects.filter(schema_name=schema_name).first()
+
+        return self._get_or_load(('schema', schema_name), load)
+
+    def clear(self):
+        logger.debug("Clearing tenant resolver cache")
+        self._cache.clear()
+
+
+tenant_resolver = TenantResolver()
@@ -0,0 +1,89 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from .models import SchemaMigration
+from .provisioning import get_migration_state
+from .migration_worker import init_worker, migrate_schema
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_schema_sizes(schema_names):
+    """
+    Total on-disk size (tables, indexes, toast) of each schema, in bytes.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT n.nspname, COALESCE(SUM(pg_total_relation_size(c.oid)), 0) "
+            "FROM pg_namespace n LEFT JOIN pg_class c ON c.relnamespace = n.oid AND c.relkind = 'r' "
+            "WHERE n.nspname = ANY(%s) GROUP BY n.nspname",
+            [list(schema_names)],
+        )
+        return dict(cursor.fetchall())
+
+
+def plan_schema_migrations(schema_names, retry_failed=True):
+    """
+    Returns the SchemaMigration rows still to run for the current migration state,
+    largest schema first so the longest migrations don't start last.
+
+    Schemas already done are skipped. Rows left RUNNING by a crashed run are
+    picked up again, FAILED ones only when retry_failed is set.
+    """
+    state = get_migration_state()
+    sizes = get_schema_sizes(schema_names)
+    existing = {m.schema_name: m for m in SchemaMigration.objects.filter(
+        schema_name__in=schema_names, migration_state=state)}
+
+    SchemaMigration.objects.bulk_create([
+        SchemaMigration(schema_name=name, migration_state=state, size_bytes=sizes.get(name, 0))
+        for name in schema_names if name not in existing
+    ], ignore_conflicts=True)
+
+    skipped = [SchemaMigration.Status.DONE]
+    if not retry_failed:
+        skipped.append(SchemaMigration.Status.FAILED)
+    planned = list(SchemaMigration.objects.filter(schema_name__in=schema_names, migration_state=state)
+                   .exclude(status__in=skipped))
+    for migration in planned:
+        migration.size_bytes = sizes.get(migration.schema_name, 0)
+    SchemaMigration.objects.bulk_update(planned, ['size_bytes'])
+    return sorted(planned, key=lambda m: m.size_bytes, reverse=True)
+
+
+def run_schema_migrations(migrations, processes, on_result=None):
+    """
+    Migrates the schemas of `migrations` (see plan_schema_migrations) in a pool of
+    `processes` worker processes and records status and duration of each one as
+    it finishes. The parent process is the only one writing SchemaMigration rows.
+    """
+    by_schema = {m.schema_name: m for m in migrations}
+    if not by_schema:
+        return []
+
+    SchemaMigration.objects.filter(pk__in=[m.pk for m in migrations]).update(
+        status=SchemaMigration.Status.RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1,
+        finished_at=None, duration_ms=None, error='')
+
+    # Workers are spawned, not forked: a forked child would share the parent's DB socket
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_worker) as pool:
+        futures = [pool.submit(migrate_schema, m.schema_name) for m in migrations]
+        for future in as_completed(futures):
+            schema_name, ok, duration_ms, error = future.result()
+            migration = by_schema[schema_name]
+            migration.status = SchemaMigration.Status.DONE if ok else SchemaMigration.Status.FAILED
+            migration.finished_at = timezone.now()
+            migration.duration_ms = duration_ms
+            migration.error = error
+            migration.save(update_fields=['status', 'finished_at', 'duration_ms', 'error'])
+            if not ok:
+                logger.error(f"Migrating {schema_name} failed: {error}")
+            if on_result is not None:
+                on_result(migration)
+    return migrations
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Tenant, Domain
+from .resolver import tenant_resolver
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_tenant_resolver(sender, **kwargs):
+    # Tenants and domains change rarely, dropping the whole cache keeps renamed
+    # domains and re-pointed hosts from being served stale
+    tenant_resolver.clear()
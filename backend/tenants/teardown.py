@@ -0,0 +1,163 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction, OperationalError
+from django.utils import timezone
+from django_tenants.utils import schema_exists
+from reminders.models import Reminder
+from users.authentication import DELETED_USER_VERSION, set_permission_version
+from .models import Domain, PooledSchema, SchemaMigration
+from .resolver import LRUCache, tenant_resolver
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TENANT_DISABLED_KEY = 'tenants:disabled:{}'
+
+# Flags read from the shared cache, reused by this process in between
+local_disabled_flags = LRUCache(maxsize=getattr(settings, 'TENANT_RESOLVER_CACHE_SIZE', 1024),
+                                ttl=getattr(settings, 'SHARED_CACHE_LOCAL_TTL', 5))
+
+# Public tables holding rows of a tenant's users, children first. The blacklist
+# references outstanding tokens, not users, hence the subquery.
+USER_TABLES = [
+    ('token_blacklist_blacklistedtoken',
+     'token_id IN (SELECT id FROM token_blacklist_outstandingtoken WHERE user_id = ANY(%s))'),
+    ('token_blacklist_outstandingtoken', 'user_id = ANY(%s)'),
+    ('users_onetimepassword', 'user_id = ANY(%s)'),
+    ('users_user_user_permissions', 'user_id = ANY(%s)'),
+    ('users_user_groups', 'user_id = ANY(%s)'),
+    ('users_profile', 'user_id = ANY(%s)'),
+    ('django_admin_log', 'user_id = ANY(%s)'),
+    ('users_user', 'id = ANY(%s)'),
+]
+
+
+def is_tenant_disabled(tenant):
+    """
+    Checked by the middleware on every request. The cache flag covers the time
+    other processes keep serving the tenant they resolved before it was disabled.
+    It is read from the shared cache at most every SHARED_CACHE_LOCAL_TTL seconds.
+    """
+    if not tenant.is_active:
+        return True
+    disabled = local_disabled_flags.get(tenant.pk)
+    if disabled is None:
+        disabled = cache.get(TENANT_DISABLED_KEY.format(tenant.pk)) is not None
+        local_disabled_flags.set(tenant.pk, disabled)
+    return disabled
+
+
+def disable_tenant(tenant, delete=False):
+    """
+    Stops serving the tenant right away, and queues it for teardown_tenants when
+    `delete` is set. Nothing is deleted here, it is safe to call from a request.
+    """
+    tenant.is_active = False
+    update_fields = ['is_active']
+    if delete and tenant.deletion_requested_at is None:
+        tenant.deletion_requested_at = timezone.now()
+        update_fields.append('deletion_requested_at')
+    tenant.save(update_fields=update_fields)
+    # Outlives every resolver entry loaded before the save (see tenants/resolver.py)
+    cache.set(TENANT_DISABLED_KEY.format(tenant.pk), True,
+              timeout=getattr(settings, 'TENANT_RESOLVER_CACHE_TTL', 300))
+    local_disabled_flags.set(tenant.pk, True)
+
+
+def get_teardown_delay():
+    """
+    Time between disabling a tenant and dropping its schema: one resolver TTL,
+    so no worker still routes requests to the schema (see tenants/resolver.py).
+    """
+    return timedelta(seconds=getattr(settings, 'TENANT_RESOLVER_CACHE_TTL', 300))
+
+
+def _execute_with_lock_timeout(sql, params=None, retries=5):
+    """
+    Runs one statement in its own transaction, giving up on locks held by other
+    sessions quickly rather than queueing (and making everyone else queue) behind them.
+    """
+    for attempt in range(retries):
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = %s", [getattr(settings, 'TENANT_TEARDOWN_LOCK_TIMEOUT', '2s')])
+                cursor.execute(sql, params)
+                return cursor.rowcount
+        except OperationalError:
+            if attempt == retries - 1:
+                raise
+            logger.warning(f"Lock timeout, retrying: {sql}")
+            time.sleep(2 ** attempt)
+
+
+def drop_tenant_schema(schema_name):
+    """
+    Drops the schema without locking public tables for the whole drop: the foreign
+    keys from tenant tables to public ones (users_user, tenants_tenant) are dropped
+    one by one first, each briefly locking only its referenced table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND connamespace = %s::regnamespace "
+            "AND confrelid IN (SELECT oid FROM pg_class WHERE relnamespace = 'public'::regnamespace)",
+            [schema_name],
+        )
+        constraints = cursor.fetchall()
+    for table, constraint in constraints:
+        _execute_with_lock_timeout('ALTER TABLE %s DROP CONSTRAINT "%s"' % (table, constraint))
+    _execute_with_lock_timeout('DROP SCHEMA IF EXISTS "%s" CASCADE' % schema_name)
+
+
+def teardown_tenant(tenant, batch_size=500, progress=None):
+    """
+    Deletes a tenant: schema first, then its public rows in batches of
+    `batch_size` users, one short transaction per batch so logins of other
+    clinics never wait on users_user for long. Every step can be rerun, a
+    teardown that crashed halfway resumes where it stopped.
+
+    Nothing is deleted until get_teardown_delay() after the tenant was
+    disabled, returns False then. `progress(message)` is called after each step.
+    """
+    progress = progress or logger.info
+    if tenant.is_active or tenant.deletion_requested_at is None:
+        disable_tenant(tenant, delete=True)
+    if tenant.deletion_requested_at > timezone.now() - get_teardown_delay():
+        progress(f"{tenant.schema_name}: disabled less than {get_teardown_delay()} ago, deferred")
+        return False
+
+    if schema_exists(tenant.schema_name):
+        drop_tenant_schema(tenant.schema_name)
+        progress(f"{tenant.schema_name}: dropped schema")
+
+    deleted = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM users_user WHERE tenant_id = %s ORDER BY id LIMIT %s",
+                           [tenant.pk, batch_size])
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if not user_ids:
+                break
+            for table, condition in USER_TABLES:
+                cursor.execute(f"DELETE FROM {table} WHERE {condition}", [user_ids])
+        # Tokens still held by these users are rejected from now on (users/authentication.py)
+        for user_id in user_ids:
+            set_permission_version(user_id, DELETED_USER_VERSION)
+        deleted += len(user_ids)
+        progress(f"{tenant.schema_name}: deleted {deleted} users")
+
+    with transaction.atomic():
+        Domain.objects.filter(tenant_id=tenant.pk).delete()
+        PooledSchema.objects.filter(schema_name=tenant.schema_name).delete()
+        SchemaMigration.objects.filter(schema_name=tenant.schema_name).delete()
+        Reminder.objects.filter(schema_name=tenant.schema_name).delete()
+        with connection.cursor() as cursor:
+            # Not tenant.delete(): its cascade would look for the tables of the dropped schema
+            cursor.execute("DELETE FROM tenants_tenant WHERE id = %s", [tenant.pk])
+    tenant_resolver.clear()
+    progress(f"{tenant.schema_name}: deleted tenant")
+    return True
@@ -0,0 +1,129 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django_tenants.clone import CloneSchema
+from django_tenants.utils import schema_context, schema_exists
+from .models import Tenant
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_template_schema_name():
+    """
+    Schema new tenants are cloned from, None when cloning is disabled.
+    """
+    return getattr(settings, 'TENANT_TEMPLATE_SCHEMA', None)
+
+
+def get_template_tenant():
+    # The template owns a Tenant row: its seed rows have a tenant FK like any other tenant's
+    return Tenant.objects.filter(schema_name=get_template_schema_name()).first()
+
+
+@lru_cache(maxsize=1)
+def get_tenant_migrations():
+    """
+    (app, name) of every TENANT_APPS migration on disk.
+    """
+    tenant_apps = {app.rsplit('.', 1)[-1] for app in settings.TENANT_APPS}
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    return frozenset(node for node in loader.graph.nodes if node[0] in tenant_apps)
+
+
+def get_seed_rows():
+    """
+    (category, item) pairs every new tenant starts with, from inventory/inventory_data.py.
+    """
+    from inventory.inventory_data import inventory_data
+    return {(data['category']['name'], item) for data in inventory_data for item in data.get('items', [])}
+
+
+def check_template():
+    """
+    Returns what differs between the template schema and what a new tenant should
+    get (migrations on disk, seed data), an empty list when the template is current.
+    """
+    schema_name = get_template_schema_name()
+    if not schema_name:
+        return ['Template cloning is disabled (TENANT_TEMPLATE_SCHEMA is not set)']
+    if not schema_exists(schema_name):
+        return [f'Template schema {schema_name} does not exist']
+    if get_template_tenant() is None:
+        return [f'Template schema {schema_name} has no tenant row']
+
+    problems = []
+    expected = get_tenant_migrations()
+    tenant_apps = {app for app, _ in expected}
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT app, name FROM "%s".django_migrations' % schema_name)
+        applied = {row for row in cursor.fetchall() if row[0] in tenant_apps}
+    for app, name in sorted(expected - applied):
+        problems.append(f'Migration {app}.{name} is not applied')
+    for app, name in sorted(applied - expected):
+        problems.append(f'Migration {app}.{name} is applied but no longer exists')
+
+    from inventory.models import InventoryItem
+    with schema_context(schema_name):
+        seeded = set(InventoryItem.objects.values_list('category__name', 'name'))
+    expected_rows = get_seed_rows()
+    if seeded != expected_rows:
+        problems.append(f'Seed data differs: {len(expected_rows - seeded)} missing, '
+                        f'{len(seeded - expected_rows)} unexpected inventory items')
+    return problems
+
+
+def rebuild_template():
+    """
+    Builds a fresh template (latest TENANT_APPS migrations, seed data) next to the
+    current one and swaps it in with a rename, so registrations never see a
+    half-built template. Run after every deploy that adds tenant migrations or
+    changes the seed data.
+    """
+    schema_name = get_template_schema_name()
+    build_schema_name = f'{schema_name}_build'
+    from inventory.seeding import seed_inventory
+
+    tenant = get_template_tenant()
+    if tenant is None:
+        tenant = Tenant(schema_name=schema_name, name='Tenant template')
+        tenant.auto_create_schema = False
+        tenant.save()
+
+    with connection.cursor() as cursor:
+        cursor.execute('DROP SCHEMA IF EXISTS "%s" CASCADE' % build_schema_name)
+        cursor.execute('CREATE SCHEMA "%s"' % build_schema_name)
+    call_command('migrate_schemas', tenant=True, schema_name=build_schema_name, interactive=False, verbosity=0)
+    seed_inventory(tenant, build_schema_name)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('DROP SCHEMA IF EXISTS "%s" CASCADE' % schema_name)
+        cursor.execute('ALTER SCHEMA "%s" RENAME TO "%s"' % (build_schema_name, schema_name))
+    return tenant
+
+
+def assign_schema(schema_name, tenant):
+    """
+    Points the rows a schema was cloned with (template seed data) at their new tenant.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT table_name FROM information_schema.columns "
+            "WHERE table_schema = %s AND column_name = 'tenant_id'",
+            [schema_name],
+        )
+        for (table,) in cursor.fetchall():
+            cursor.execute('UPDATE "%s"."%s" SET tenant_id = %%s' % (schema_name, table), [tenant.pk])
+
+
+def clone_template(schema_name):
+    """
+    Copies the template's tables, sequences, constraints and rows into a new schema
+    in a single server-side call (clone_schema() from django-tenants). The cost does
+    not grow with the number of migrations, unlike migrate_schemas.
+    """
+    CloneSchema().clone_schema(get_template_schema_name(), schema_name, 'DATA')
@@ -0,0 +1,20 @@
+from unittest import SkipTest
+
+from django.db import connection
+
+# Created by the tenant migrations (patients.0005, appointments.0005)
+TENANT_EXTENSIONS = ['pg_trgm', 'btree_gist']
+
+
+def skip_without_tenant_schemas():
+    """
+    Raises SkipTest unless tenant schemas can be migrated here: PostgreSQL with
+    the contrib extensions the tenant migrations create.
+    """
+    if connection.vendor != 'postgresql':
+        raise SkipTest("Tenant schemas need PostgreSQL")
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT name FROM pg_available_extensions WHERE name = ANY(%s)', [TENANT_EXTENSIONS])
+        missing = set(TENANT_EXTENSIONS) - {name for name, in cursor.fetchall()}
+    if missing:
+        raise SkipTest(f"PostgreSQL extensions not available: {', '.join(sorted(missing))}")
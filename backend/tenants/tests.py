@@ -1,3 +1,85 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from users.authentication import local_permission_versions
+from users.models import User
+from users.serializer import UserRegisterSerializer
+from .middleware import CustomTenantMiddleware
+from .models import Domain, PooledSchema, Tenant
+from .provisioning import provision_pool_schema
+from .resolver import tenant_resolver
+from .teardown import local_disabled_flags
+from .testing import skip_without_tenant_schemas
 
-# Create your tests here.
+class TenantMiddlewareQueryTests(TestCase):
+    """
+    Against the configured cache: with the database one, every shared cache
+    lookup of a request is a query.
+    """
+    def setUp(self):
+        cache.clear()
+        tenant_resolver.clear()
+        local_disabled_flags.clear()
+        local_permission_versions.clear()
+        # Only the public schema is needed: no query of these requests reaches the tenant's
+        self.tenant = Tenant(schema_name='clinic_middleware', name='Clinic')
+        self.tenant.auto_create_schema = False
+        self.tenant.save()
+        Domain.objects.create(domain='clinic.localhost', tenant=self.tenant, is_primary=True)
+        self.user = User.objects.create_user('dentist@example.com', 'Ada', 'Lovelace', 'secret-password',
+                                             tenant=self.tenant, role=User.Role.DENTIST)
+        self.middleware = CustomTenantMiddleware(lambda request: HttpResponse())
+        # The middleware leaves the connection on the tenant's schema
+        self.addCleanup(connection.set_schema_to_public)
+
+    def get(self, **headers):
+        return self.middleware(RequestFactory().get('/api/appointments/', HTTP_HOST='clinic.localhost', **headers))
+
+    def test_cold_request_resolves_the_host_once(self):
+        # The host lookup and the shared disabled flag of the tenant
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get().status_code, 401)
+
+    def test_warm_request_runs_no_query(self):
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {self.user.tokens()['access']}"}
+        self.assertEqual(self.get(**headers).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(**headers).status_code, 200)
+
+
+@override_settings(TENANT_SCHEMA_POOL_ENABLED=True)
+class RegistrationQueryTests(TestCase):
+    # Claim, tenant, tenant_id of the cloned rows (one UPDATE per table), inventory seed, user,
+    # profile, domain and the cache entries: 33 with the database cache, fewer with Redis
+    MAX_QUERIES = 40
+    DDL = ('CREATE', 'ALTER', 'DROP', 'TRUNCATE')
+
+    @classmethod
+    def setUpClass(cls):
+        # Before the class transaction is opened, tearDownClass doesn't run on a skip
+        skip_without_tenant_schemas()
+        super().setUpClass()
+
+    def setUp(self):
+        # Migrated out of band, like fill_schema_pool does
+        self.schema_name = provision_pool_schema().schema_name
+        self.addCleanup(connection.set_schema_to_public)
+
+    def test_registration_on_a_pooled_schema(self):
+        serializer = UserRegisterSerializer(data={
+            'email': 'owner@example.com', 'first_name': 'Ada', 'last_name': 'Lovelace',
+            'password': 'secret-password-1', 'password2': 'secret-password-1', 'clinic_name': 'Pool Clinic',
+        })
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as context:
+            user, domain = serializer.save()
+        # The pooled schema is already migrated: no schema change and no migration is recorded
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual([sql for sql in queries if sql.lstrip().upper().startswith(self.DDL)], [])
+        self.assertEqual([sql for sql in queries if 'django_migrations' in sql], [])
+        self.assertLessEqual(len(queries), self.MAX_QUERIES, '\n'.join(queries))
+        self.assertEqual(user.tenant.schema_name, self.schema_name)
+        self.assertEqual(domain, 'pool-clinic.localhost')
+        self.assertFalse(PooledSchema.objects.exists())
@@ -5,3 +5,6 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     label = 'users'
+
+    def ready(self):
+        import users.signals
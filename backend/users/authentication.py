@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from tenants.resolver import LRUCache, tenant_resolver
+from .models import User
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERMISSION_VERSION_KEY = 'users:permission_version:{}'
+
+# Stored for deleted users so their tokens always look stale
+DELETED_USER_VERSION = -1
+
+# Versions read from the shared cache, reused by this process in between
+local_permission_versions = LRUCache(maxsize=4096, ttl=getattr(settings, 'SHARED_CACHE_LOCAL_TTL', 5))
+
+
+def get_permission_version(user_id):
+    """
+    Current permission version of a user. Served from this process for
+    SHARED_CACHE_LOCAL_TTL seconds, then from the shared cache, only hits the
+    DB on a miss. A version bumped by another process is seen within the TTL.
+    """
+    version = local_permission_versions.get(user_id)
+    if version is not None:
+        return version
+    key = PERMISSION_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = (User.objects.filter(id=user_id)
+                   .values_list('permission_version', flat=True)
+                   .first())
+        version = DELETED_USER_VERSION if version is None else version
+        # add(), not set(): never overwrites a version bumped since the read
+        cache.add(key, version)
+    local_permission_versions.set(user_id, version)
+    return version
+
+
+def set_permission_version(user_id, version):
+    cache.set(PERMISSION_VERSION_KEY.format(user_id), version)
+    local_permission_versions.set(user_id, version)
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the access token claims
+    (tenant, domain, role, is_superuser, perm_version) instead of loading the user row.
+
+    The user is only read from the DB when the token's perm_version is stale, or
+    when the token predates the tenant claims. The result is kept on the Django
+    request so the token is decoded once, whether the tenant middleware or DRF asks first.
+    """
+
+    def authenticate(self, request):
+        django_request = getattr(request, '_request', request)
+        if not hasattr(django_request, 'jwt_auth'):
+            django_request.jwt_auth = super().authenticate(request)
+        return django_request.jwt_auth
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        token_version = validated_token.get('perm_version')
+        if token_version is None or token_version != get_permission_version(user_id):
+            logger.info(f"Stale token claims for user {user_id}, loading from the database")
+            user = super().get_user(validated_token)
+            user.tenant_schema = user.tenant.schema_name if user.tenant_id else None
+            user.tenant_domain = tenant_resolver.get_primary_domain(user.tenant_id) if user.tenant_id else None
+            return user
+
+        # Claims are current: build the user from them, other columns stay deferred
+        # and are loaded on first access
+        claims = {
+            'id': user_id,
+            'role': validated_token['role'],
+            'is_active': True,
+            'is_superuser': validated_token.get('is_superuser', False),
+            'permission_version': token_version,
+        }
+        # from_db expects the values in the model's field order
+        field_names = [f.attname for f in User._meta.concrete_fields if f.attname in claims]
+        user = User.from_db(User.objects.db, field_names, [claims[name] for name in field_names])
+        user.tenant_schema = validated_token['tenant']
+        user.tenant_domain = validated_token['domain']
+        return user
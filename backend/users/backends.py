@@ -0,0 +1,195 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import transaction
+from tenants.resolver import LRUCache
+from .models import User
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Default permissions of each role, used for any role that has no Group of the same
+# name. Admins can override a role without a restart by creating that Group
+# (e.g. "DENTIST") in the admin and editing its permissions.
+
+# Edit permissions when you add more models, they need to have the name of the app at the start
+# App name can be found under App_directory/apps.py => ModelConfig.name
+# format: appname.action_modelname. eg: 'users.add_user'
+# actions = view, add, change, delete
+
+# you can add Custom Permissions but it's not recommended you do so witouth confirmation from the team
+
+#TODO: Enforce Permissions on patient views by adding a Permission class and enforce them by adding them to the roles
+DEFAULT_ROLE_PERMISSIONS = {
+    User.Role.ADMIN: [
+        # Users
+        'users.view_user',
+        'users.add_user',
+        'users.change_user',
+        'users.delete_user',
+
+        # Appointments
+        'appointments.view_appointment',
+        'appointments.add_appointment',
+        'appointments.change_appointment',
+        'appointments.delete_appointment',
+        'appointments.view_workinghours',
+        'appointments.add_workinghours',
+        'appointments.change_workinghours',
+        'appointments.delete_workinghours',
+        'appointments.view_timeoff',
+        'appointments.add_timeoff',
+        'appointments.change_timeoff',
+        'appointments.delete_timeoff',
+        'appointments.view_waitlistentry',
+        'appointments.add_waitlistentry',
+        'appointments.change_waitlistentry',
+        'appointments.delete_waitlistentry',
+
+        # Billing
+        # 'add_billing',
+        # 'change_billing',
+        # 'delete_billing',
+        # # Inventory
+        # 'view_reports', 'manage_inventory'
+    ],
+    User.Role.DENTIST: [
+        'appointments.add_appointment', 'appointments.change_appointment',
+        'appointments.view_appointment', 'appointments.delete_appointment',
+        'appointments.view_workinghours', 'appointments.view_timeoff',
+        'appointments.add_timeoff', 'appointments.change_timeoff', 'appointments.delete_timeoff',
+        'appointments.view_waitlistentry', 'appointments.add_waitlistentry',
+        'appointments.change_waitlistentry', 'appointments.delete_waitlistentry',
+
+        # ADD PATIENT PERMISSIONS
+        'users.view_user',
+        # 'view_medical_records', 'add_medical_records',
+        # 'view_patient', 'add_patient'
+    ],
+    User.Role.RECEPTIONIST: [
+        'appointments.view_appointment', 'appointments.delete_appointment',
+        'appointments.add_appointment', 'appointments.change_appointment',
+        'appointments.view_workinghours', 'appointments.view_timeoff',
+        'appointments.view_waitlistentry', 'appointments.add_waitlistentry',
+        'appointments.change_waitlistentry', 'appointments.delete_waitlistentry',
+        # 'view_patient', 'add_patient',
+        # 'view_billing'
+    ],
+}
+
+ROLE_MATRIX_VERSION_KEY = 'users:role_matrix_version'
+
+
+def bump_role_matrix_version():
+    """
+    Makes every process recompile its matrix, once the change is committed: a
+    process recompiling earlier would read the old groups under the new version.
+    """
+    def publish():
+        cache.set(ROLE_MATRIX_VERSION_KEY, time.time_ns(), timeout=None)
+        # This process doesn't wait for its next read of the version
+        role_permission_matrix.invalidate()
+
+    transaction.on_commit(publish)
+
+
+class RolePermissionMatrix:
+    """
+    role -> frozenset of 'app_label.codename', compiled once per process.
+
+    Recompiled when the version in the shared cache changes (bumped by the Group
+    signals in users/signals.py) or after ROLE_PERMISSIONS_TTL seconds, which
+    bounds staleness if the cache loses the version. The version is read at most
+    every SHARED_CACHE_LOCAL_TTL seconds, not on every has_perm.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._version = None
+        self._compiled_at = 0
+        self._shared_version = None
+        self._version_read_at = float('-inf')
+
+    def _get_version(self):
+        now = time.monotonic()
+        if now - self._version_read_at > getattr(settings, 'SHARED_CACHE_LOCAL_TTL', 5):
+            self._shared_version = cache.get(ROLE_MATRIX_VERSION_KEY)
+            self._version_read_at = now
+        return self._shared_version
+
+    def invalidate(self):
+        # The next get() reads the version, a new one recompiles the matrix
+        self._version_read_at = float('-inf')
+
+    def _compile(self):
+        matrix = {role: set(perms) for role, perms in DEFAULT_ROLE_PERMISSIONS.items()}
+        rows = (Group.objects.filter(name__in=User.Role.values)
+                .values_list('name', 'permissions__content_type__app_label', 'permissions__codename'))
+        overridden = set()
+        for role, app_label, codename in rows:
+            if role not in overridden:
+                matrix[role] = set()
+                overridden.add(role)
+            if codename is not None:
+                matrix[role].add(f"{app_label}.{codename}")
+        logger.info(f"Compiled role permission matrix, overridden roles: {sorted(overridden)}")
+        return {role: frozenset(perms) for role, perms in matrix.items()}
+
+    def get(self, role):
+        version = self._get_version()
+        ttl = getattr(settings, 'ROLE_PERMISSIONS_TTL', 300)
+        if self._matrix is None or version != self._version or time.monotonic() - self._compiled_at > ttl:
+            with self._lock:
+                self._matrix = self._compile()
+                self._version = version
+                self._compiled_at = time.monotonic()
+        return self._matrix.get(role, frozenset())
+
+
+role_permission_matrix = RolePermissionMatrix()
+
+
+class RolePermissionBackend(ModelBackend):
+    """
+    Authorizes from the user's role instead of per-user auth_permission rows.
+
+    Permissions are the role's set from RolePermissionMatrix plus the user's own
+    user_permissions, used as optional per-user overrides. Overrides are cached per
+    (user, permission_version), so in steady state has_perm is a set lookup.
+    Login (authenticate) is inherited from ModelBackend.
+    """
+
+    _user_overrides = LRUCache(maxsize=4096, ttl=3600)
+
+    def get_user_overrides(self, user_obj):
+        key = (user_obj.pk, user_obj.permission_version)
+        overrides = self._user_overrides.get(key)
+        if overrides is None:
+            overrides = frozenset(
+                f"{app_label}.{codename}"
+                for app_label, codename in Permission.objects.filter(user=user_obj.pk)
+                .values_list('content_type__app_label', 'codename')
+            )
+            self._user_overrides.set(key, overrides)
+        return overrides
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return frozenset()
+        return self.get_user_overrides(user_obj)
+
+    def get_group_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return frozenset()
+        return role_permission_matrix.get(user_obj.role)
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return frozenset()
+        return role_permission_matrix.get(user_obj.role) | self.get_user_overrides(user_obj)
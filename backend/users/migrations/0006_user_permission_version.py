@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_user_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='permission_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import Q
+
+# Role defaults as they were written per user by User._assign_role_permissions,
+# roles are now resolved by users.backends.RolePermissionBackend
+ROLE_PERMISSIONS = {
+    'ADMIN': [
+        'users.view_user', 'users.add_user', 'users.change_user', 'users.delete_user',
+        'appointments.view_appointment', 'appointments.add_appointment',
+        'appointments.change_appointment', 'appointments.delete_appointment',
+    ],
+    'DENTIST': [
+        'appointments.add_appointment', 'appointments.change_appointment',
+        'appointments.view_appointment', 'appointments.delete_appointment',
+        'users.view_user',
+    ],
+    'RECEPTIONIST': [
+        'appointments.view_appointment', 'appointments.delete_appointment',
+        'appointments.add_appointment', 'appointments.change_appointment',
+    ],
+}
+
+
+def remove_role_user_permissions(apps, schema_editor):
+    """
+    Drops the per-user rows that only duplicate the user's role, anything else
+    stays as a per-user override.
+    """
+    User = apps.get_model('users', 'User')
+    UserPermission = User.user_permissions.through
+    for role, permissions in ROLE_PERMISSIONS.items():
+        q_objects = Q()
+        for perm in permissions:
+            app_label, codename = perm.split('.', 1)
+            q_objects |= Q(permission__content_type__app_label=app_label, permission__codename=codename)
+        UserPermission.objects.filter(q_objects, user__role=role).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_permission_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_role_user_permissions, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
 from .manager import UserManager
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth.models import  Permission
+from .tokens import TenantRefreshToken
 
 class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(max_length= 255, unique=True, null=False, blank=False, verbose_name=_("Email address"))
@@ -37,6 +36,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     role = models.CharField(max_length=20, choices=Role.choices, default=Role.RECEPTIONIST)
 
+    # Bumped whenever a field embedded in the access token claims changes, tokens carrying
+    # an older version are re-checked against the DB (see users/authentication.py)
+    permission_version = models.PositiveIntegerField(default=1)
+    PERMISSION_FIELDS = ('role', 'is_active', 'is_superuser', 'tenant_id')
+
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name"]
@@ -56,92 +60,37 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.fullname
 
     def tokens(self):
-        refresh = RefreshToken.for_user(self)
+        refresh = TenantRefreshToken.for_user(self)
         return {
             "refresh":str(refresh),
             "access":str(refresh.access_token)
         }
-        
-    def save(self, *args, **kwargs):
-        is_new = self._state.adding  # Check if this is a new user
-        super().save(*args, **kwargs)
 
-        if is_new:  # Only assign permissions on creation
-            self._assign_role_permissions()
-        
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() can tell if the token claims went stale
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
-    def _assign_role_permissions(self):
-        # Clear existing permissions
-        from django.db.models import Q
+    def save(self, *args, **kwargs):
+        from .authentication import set_permission_version
 
-        self.user_permissions.clear()
-        
-        # Define permissions for each role
-        
-        # Edit permissions when you add more models, they need to have the name of the app at the start 
-        # App name can be found under App_directory/apps.py => ModelConfig.name
-        # format: appname.action_modelname. eg: 'users.add_user'
-        # actions = view, add, change, delete
-        
-        # you can add Custom Permissions but it's not recommended you do so witouth confirmation from the team
-
-
-        #TODO: Enforce Permissions on patient views by adding a Permission class and enforce them by adding them to the roles
-         
-        role_permissions = {
-            self.Role.ADMIN: [
-                # Users
-                'users.view_user',
-                'users.add_user',
-                'users.change_user',
-                'users.delete_user',
-
-                
-                # Appointments
-                'appointments.view_appointment',
-                'appointments.add_appointment',
-                'appointments.change_appointment',
-                'appointments.delete_appointment',
-                
-                # Billing
-                # 'add_billing', 
-                # 'change_billing', 
-                # 'delete_billing',
-                # # Inventory
-                # 'view_reports', 'manage_inventory'
-            ],
-            self.Role.DENTIST: [
-                'appointments.add_appointment', 'appointments.change_appointment',
-                'appointments.view_appointment', 'appointments.delete_appointment',
-                
-                # ADD PATIENT PERMISSIONS
-                'users.view_user',
-                # 'view_medical_records', 'add_medical_records',
-                # 'view_patient', 'add_patient'
-            ],
-            self.Role.RECEPTIONIST: [
-                'appointments.view_appointment','appointments.delete_appointment',
-                'appointments.add_appointment', 'appointments.change_appointment',
-                # 'view_patient', 'add_patient',
-                # 'view_billing'
-            ]
-        }
+        loaded = getattr(self, '_loaded_values', {})
+        if any(field in loaded and loaded[field] != getattr(self, field) for field in self.PERMISSION_FIELDS):
+            self.permission_version += 1
+        super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {field: getattr(self, field) for field in self.PERMISSION_FIELDS if field not in deferred}
+        set_permission_version(self.id, self.permission_version)
 
-        # Get permissions for the user's role
-        # if self.role in role_permissions:
-        #     permissions = Permission.objects.filter(codename__in=role_permissions[self.role])
-        #     self.user_permissions.add(*permissions)
-        
-        if self.role in role_permissions:
-            permissions_to_add = role_permissions[self.role]
-            q_objects = Q()
-            for perm in permissions_to_add:
-                print(perm)
-                app_label, codename = perm.split('.', 1)
-                q_objects |= Q(content_type__app_label=app_label, codename=codename)
-
-            permissions = Permission.objects.filter(q_objects)
-            self.user_permissions.add(*permissions)
+    def delete(self, *args, **kwargs):
+        from .authentication import set_permission_version, DELETED_USER_VERSION
+
+        user_id = self.id
+        result = super().delete(*args, **kwargs)
+        set_permission_version(user_id, DELETED_USER_VERSION)
+        return result
 
 
 class OnetimePassword(models.Model):
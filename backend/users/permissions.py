@@ -7,9 +7,8 @@ class CanManageUsers(BasePermission):
     # format for user.has_perm is appname.action_modelname
     # user will have these permission based on his role. at this point only Admin role can manage users
     def has_permission(self, request, view):
-        logger.info(f"Checking permissions for user: {request.user}")
+        logger.info(f"Checking permissions for user: {request.user.pk}")
         logger.info(f"Method: {request.method}")
-        logger.info(f"All permissions: {request.user.get_all_permissions()}")
 
         if request.method == 'GET':
             has_perm = request.user.has_perm('users.view_user')
@@ -8,10 +8,15 @@ from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.contrib.sites.shortcuts import get_current_site
 from django.urls import reverse
 from .utils import send_normal_email
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.tokens import RefreshToken, AccessToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import set_tenant_claims
 from .models import Profile
 from django.conf import settings
 from tenants.models import Tenant, Domain
+from tenants.provisioning import create_tenant
+from tenants.teardown import is_tenant_disabled
 from django.db import transaction
 import uuid
 from decouple import config
@@ -24,9 +29,6 @@ from django_tenants.utils import schema_context
 import logging
 logger = logging.getLogger(__name__)
 
-from inventory.models import Category, InventoryItem
-from inventory.inventory_data import inventory_data
-
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -68,15 +70,13 @@ class UserRegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password2', None) # Remove password2 as it's not needed for user creation
-        schema_name = f"tenant_{uuid.uuid4().hex}"  # e.g., "tenant_1a2b3c4d5e..."
-        
+
         with transaction.atomic():
-            tenant = Tenant.objects.create(
+            # Claims a pre-migrated schema from the pool, see tenants/provisioning.py
+            tenant = create_tenant(
                 name=validated_data['clinic_name'],
-                schema_name = schema_name,  # Makes sure schema_name is unique
                 paid_until=None  # We can set a trial period date here
             )
-            tenant.save()
             
             user = User.objects.create_user(
                 email=validated_data.get('email'),
@@ -113,24 +113,8 @@ class UserRegisterSerializer(serializers.ModelSerializer):
                             "clinic_name": "Unable to generate unique domain name. Please try a different clinic name."
                         })
             
-            # Inventory
-            with schema_context(tenant.schema_name):
-                try:
-                    for data in inventory_data:
-                        category_data = data.get('category', 'N/A')
-                        items = data.get('items', [])
-                        
-                        category, _ = Category.objects.get_or_create(tenant=tenant, **category_data)
-                        logger.info(f"Created {category}")
-                        inventory_items = [InventoryItem(tenant=tenant, category=category, name=item) for item in items]
-                        
-                        if inventory_items:
-                            logger.info(f"Adding {inventory_items}")
-                            InventoryItem.objects.bulk_create(inventory_items)
-                        else:
-                            logger.info(f"No inventory_items are being added")
-                except Exception as e:
-                    print(f"Error creating inventory: {str(e)}")
+            # The default inventory is seeded by inventory.seeding.seed_inventory() on the
+            # post_schema_sync that create_tenant() triggers (see inventory/signals.py)
 
         return (user, domain.domain) 
     
@@ -252,6 +236,25 @@ class SetNewPasswordSerializer(serializers.Serializer):
             return AuthenticationFailed("link is invalid or has expired")
 
 
+class TenantTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshing re-reads the tenant claims from the user, so a token with a stale
+    perm_version gets current claims instead of copying the old ones again.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = User.objects.filter(id=access[api_settings.USER_ID_CLAIM]).select_related('tenant').first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("User not found or inactive")
+        if user.tenant is not None and is_tenant_disabled(user.tenant):
+            raise AuthenticationFailed("This clinic has been disabled")
+        set_tenant_claims(access, user)
+        data['access'] = str(access)
+        return data
+
+
 class LogoutUserSerializer(serializers.Serializer):
     refresh_token=serializers.CharField()
 
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import Group
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from .authentication import set_permission_version
+from .backends import bump_role_matrix_version
+from .models import User
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_role_permission_matrix(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_role_matrix_version()
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_overrides(sender, instance, action, reverse, pk_set, **kwargs):
+    # Overrides are cached per permission_version, bumping it also makes the
+    # user's tokens stale so the next request re-reads the user
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        user_ids = [instance.pk]
+    elif pk_set:
+        user_ids = list(pk_set)
+    else:
+        return
+    User.objects.filter(pk__in=user_ids).update(permission_version=F('permission_version') + 1)
+    for user_id, version in User.objects.filter(pk__in=user_ids).values_list('id', 'permission_version'):
+        set_permission_version(user_id, version)
+    if isinstance(instance, User) and 'permission_version' not in instance.get_deferred_fields():
+        instance.refresh_from_db(fields=['permission_version'])
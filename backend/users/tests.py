@@ -1,4 +1,65 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from .authentication import PERMISSION_VERSION_KEY, TenantJWTAuthentication, local_permission_versions
+from .backends import RolePermissionMatrix
+from .models import User
 
-# Create your tests here.
- 
\ No newline at end of file
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_permission_versions.clear()
+        self.user = User.objects.create_user('dentist@example.com', 'Ada', 'Lovelace', 'secret-password',
+                                             role=User.Role.DENTIST)
+        self.token = self.user.tokens()['access']
+
+    def authenticate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return TenantJWTAuthentication().authenticate(request)
+
+    def test_current_token_is_accepted_from_its_claims(self):
+        user, _ = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.role, User.Role.DENTIST)
+
+    def test_token_of_deactivated_user_is_rejected(self):
+        self.authenticate()
+        # Deactivated by another process: only the shared cache and the DB know
+        other = User.objects.get(pk=self.user.pk)
+        other.is_active = False
+        other.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_is_rechecked_when_the_cached_version_expired(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False, permission_version=2)
+        cache.delete(PERMISSION_VERSION_KEY.format(self.user.pk))
+        # And this process's copy is past its SHARED_CACHE_LOCAL_TTL
+        local_permission_versions.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class RolePermissionMatrixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SHARED_CACHE_LOCAL_TTL=0)
+    def test_group_change_reaches_other_processes(self):
+        # Another worker's matrix, compiled before the change
+        matrix = RolePermissionMatrix()
+        self.assertNotIn('users.view_user', matrix.get(User.Role.RECEPTIONIST))
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.create(name=User.Role.RECEPTIONIST)
+            group.permissions.add(Permission.objects.get(content_type__app_label='users', codename='view_user'))
+        self.assertEqual(matrix.get(User.Role.RECEPTIONIST), frozenset({'users.view_user'}))
+
+    def test_permission_checks_read_the_version_once(self):
+        matrix = RolePermissionMatrix()
+        matrix.get(User.Role.DENTIST)
+        # The default cache is the database one: a version read would be a query
+        with self.assertNumQueries(0):
+            for role in User.Role.values:
+                matrix.get(role)
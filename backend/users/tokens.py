@@ -0,0 +1,27 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+from tenants.resolver import tenant_resolver
+
+
+def set_tenant_claims(token, user):
+    """
+    Embeds what the tenant middleware and permission checks need in `token`,
+    so requests can be authorized without loading the user (see users/authentication.py).
+    """
+    token['tenant'] = user.tenant.schema_name if user.tenant_id else None
+    token['domain'] = tenant_resolver.get_primary_domain(user.tenant_id) if user.tenant_id else None
+    token['role'] = user.role
+    token['is_superuser'] = user.is_superuser
+    token['perm_version'] = user.permission_version
+
+
+class TenantRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the tenant claims, SimpleJWT copies them to every
+    access token derived from it.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_tenant_claims(token, user)
+        return token
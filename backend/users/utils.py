@@ -27,6 +27,21 @@ def send_code_to_user(email):
 from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
 
+def get_resend_connection():
+    """
+    SMTP connection to Resend, not opened yet. Open it once (`with`) to send many
+    messages over it. RESEND_SMTP_HOST, RESEND_SMTP_PORT and RESEND_SMTP_USE_TLS
+    point it at a local SMTP server in development.
+    """
+    return get_connection(
+        host=settings.RESEND_SMTP_HOST,
+        port=settings.RESEND_SMTP_PORT,
+        username=settings.RESEND_SMTP_USERNAME,
+        password=config("RESEND_API_KEY", default=""),
+        use_tls=settings.RESEND_SMTP_USE_TLS,
+    )
+
+
 def resend_email(email):
     subject = "DentiaPro Email Verification"
     otp_code = generateOtp()
@@ -87,13 +102,7 @@ def resend_email(email):
     </html>
     """
 
-    with get_connection(
-        host=settings.RESEND_SMTP_HOST,
-        port=settings.RESEND_SMTP_PORT,
-        username=settings.RESEND_SMTP_USERNAME,
-        password=config("RESEND_API_KEY"),
-        use_tls=True,
-    ) as connection:
+    with get_resend_connection() as connection:
         email_message = EmailMessage(
             subject=subject,
             body=message,
@@ -108,13 +117,7 @@ def resend_email(email):
 
 def send_normal_email(data):
     from_email = "noreply@crafitori.com"
-    with get_connection(
-        host=settings.RESEND_SMTP_HOST,
-        port=settings.RESEND_SMTP_PORT,
-        username=settings.RESEND_SMTP_USERNAME,
-        password=config("RESEND_API_KEY"),
-        use_tls=True,
-    ) as connection:
+    with get_resend_connection() as connection:
         email=EmailMessage(
             subject=data['email_subject'],
             body=data['email_body'],
@@ -122,4 +125,4 @@ def send_normal_email(data):
             to=[data['to_email']],
             connection=connection
         )
-    email.send()
+        email.send()
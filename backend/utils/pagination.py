@@ -1,5 +1,13 @@
+import base64
+import json
+from operator import attrgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
@@ -12,4 +20,125 @@ class CustomPagination(PageNumberPagination):
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data
-        })
\ No newline at end of file
+        })
+
+
+class KeysetPagination(CustomPagination):
+    """
+    Keyset (seek) pagination on the view's `keyset_ordering`, e.g.
+    ('last_name', 'first_name', 'id'): a page is "the next page_size rows after
+    the last row of the previous page", an index range scan whatever the depth,
+    instead of OFFSET + COUNT(*).
+
+    Opt-in per request: ?cursor= (empty for the first page) switches to keyset
+    mode, without it the endpoint keeps page numbers. next/previous links carry
+    an opaque cursor; count is only computed with ?count=true. Querysets ordered
+    differently (e.g. search ranked by similarity) are paginated by page number.
+
+    The last ordering field must be unique (the pk). NULLs are placed the way
+    PostgreSQL sorts them: last ascending, first descending.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = False
+        ordering = tuple(getattr(view, 'keyset_ordering', ()))
+        explicit = tuple(str(field) for field in queryset.query.order_by)
+        if (self.cursor_query_param not in request.query_params or not ordering
+                or explicit != ordering[:len(explicit)]):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) == 'true' else None
+
+        values, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by(*(name if desc else f'-{name}' for name, desc in self.fields))
+        else:
+            queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.seek(queryset.model, values, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        return rows
+
+    def seek(self, model, values, reverse):
+        """
+        Rows after `values` in the ordering (before them when `reverse`).
+        """
+        fields = [(name, desc != reverse, model._meta.get_field(name).null) for name, desc in self.fields]
+
+        def after(index):
+            name, desc, nullable = fields[index]
+            value = values[index]
+            rest = after(index + 1) if index + 1 < len(fields) else Q(pk__in=[])
+            if value is None:
+                same = Q(**{f'{name}__isnull': True}) & rest
+                # Descending, NULLs come first: every non-NULL row is after them
+                return same | Q(**{f'{name}__isnull': False}) if desc else same
+            condition = Q(**{f'{name}__{"lt" if desc else "gt"}': value}) | (Q(**{name: value}) & rest)
+            if nullable and not desc:
+                condition |= Q(**{f'{name}__isnull': True})
+            return condition
+
+        condition = after(0)
+        name, desc, nullable = fields[0]
+        if values[0] is not None and not nullable:
+            # Redundant, but gives the planner an index range on the leading column
+            condition &= Q(**{f'{name}__{"lte" if desc else "gte"}': values[0]})
+        return condition
+
+    def encode_cursor(self, row, reverse):
+        values = [attrgetter(name)(row) for name, _ in self.fields]
+        payload = json.dumps({'v': values, 'r': reverse}, cls=DjangoJSONEncoder)
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            values, reverse = payload['v'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound('Invalid cursor')
+        return values, reverse
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        return self.encode_cursor(self.last, reverse=False) if self.has_next and self.last else None
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            # Past the end: the first page is the closest thing to a previous one
+            return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, '')
+        return self.encode_cursor(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
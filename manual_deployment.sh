@@ -89,6 +89,17 @@ cd backend
 echo "Running database migrations..."
 python3 manage.py migrate_schemas --shared
 
+# Cache shared by the workers when REDIS_URL is not set (see core/settings.py)
+python3 manage.py createcachetable
+
+# Then every tenant schema, in parallel and resumable if the deploy is interrupted
+echo "Running migrations for tenant schemas..."
+python3 manage.py migrate_tenant_schemas
+
+# New tenants are cloned from the template schema, rebuild it when migrations or seed data changed
+echo "Rebuilding the tenant template schema if needed..."
+python3 manage.py rebuild_tenant_template --if-stale
+
 # Collect static files for production serving (good practice).
 # echo "Collecting static files..."
 # python3 manage.py collectstatic --noinput --clear
@@ -98,4 +109,4 @@ python3 manage.py migrate_schemas --shared
 # This is the final step. It starts the Gunicorn server.
 # This command runs in the foreground and will keep the script alive.
 echo "Starting Gunicorn server..."
-python3 -m gunicorn core.wsgi:application --bind 0.0.0.0:8000 --timeout 120
\ No newline at end of file
+python3 -m gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000 --timeout 120
\ No newline at end of file